@@ -0,0 +1,113 @@
+from fastapi import APIRouter, Depends, HTTPException
+from loguru import logger
+
+import scheduler
+from auth.tools import authenticate_user
+from bot_pool import bot_tokens
+from profiler import profiling
+from repository import ChannelRepository
+from settings import Settings, get_settings
+from startup import startup_timer
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+cfg: Settings = get_settings()
+
+
+@router.get("/profile")
+async def profile_status(authorized: bool = Depends(authenticate_user)) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /admin/profile")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    return profiling.status()
+
+
+@router.post("/profile/posting")
+async def profile_posting(
+    runs: int = 1, authorized: bool = Depends(authenticate_user)
+) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /admin/profile/posting")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if runs < 1:
+        raise HTTPException(status_code=400, detail="runs must be positive")
+
+    profiling.arm_posting(runs)
+    return {"status": "ok", **profiling.status()}
+
+
+@router.post("/profile/routes")
+async def profile_routes(
+    pattern: str, count: int = 1, authorized: bool = Depends(authenticate_user)
+) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /admin/profile/routes")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if count < 1:
+        raise HTTPException(status_code=400, detail="count must be positive")
+
+    try:
+        profiling.arm_routes(pattern, count)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pattern: {e}")
+    return {"status": "ok", **profiling.status()}
+
+
+@router.delete("/profile")
+async def profile_off(authorized: bool = Depends(authenticate_user)) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /admin/profile")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    profiling.disarm()
+    return {"status": "ok"}
+
+
+@router.get("/startup")
+async def startup_report(authorized: bool = Depends(authenticate_user)) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /admin/startup")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    return startup_timer.report()
+
+
+@router.get("/retries")
+async def retries_status(authorized: bool = Depends(authenticate_user)) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /admin/retries")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if scheduler.pipeline is None:
+        return {"pending_retries": 0, "in_flight": {}, "open_circuits": {}}
+    return scheduler.pipeline.retry_status()
+
+
+@router.get("/bots")
+async def bots_status(authorized: bool = Depends(authenticate_user)) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /admin/bots")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    # Токены не отдаём, только id ботов и число их каналов
+    loads = ChannelRepository.bot_loads()
+    return {bot_id: loads.get(bot_id, 0) for bot_id in bot_tokens()}
+
+
+@router.get("/prefetch")
+async def prefetch_status(authorized: bool = Depends(authenticate_user)) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /admin/prefetch")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if scheduler.pipeline is None:
+        return {
+            "hits": 0,
+            "misses": 0,
+            "late": 0,
+            "invalidated": 0,
+            "failed": 0,
+            "buffered": 0,
+        }
+    return scheduler.pipeline.prefetch_status()
@@ -0,0 +1,221 @@
+import json
+import os
+import tarfile
+import time
+from typing import Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from settings import Settings, get_settings
+
+cfg: Settings = get_settings()
+
+BUNDLE_SUFFIX = ".bundle"
+INDEX_SUFFIX = ".idx.json"
+
+
+class ArchivedPostNotFound(Exception):
+    pass
+
+
+def post_number(file_name: str) -> str:
+    """Номер поста по имени файла (0001_1.jpg -> 0001)"""
+    return file_name.split(".")[0].split("_")[0]
+
+
+class DoneArchiver:
+    """Упаковывает старые группы из done/ в сжатые бандлы с индексом.
+
+    Бандл - это последовательность gzip-tar блоков (по одному на пост),
+    рядом лежит индекс: номер поста -> смещение, длина, время публикации.
+    """
+
+    def __init__(
+        self,
+        base_dir: str = cfg.base_dir,
+        archive_after_hours: int = cfg.archive_after_hours,
+        retention_days: int = cfg.archive_retention_days,
+        bundle_max_mb: int = cfg.archive_bundle_max_mb,
+    ):
+        self.base_dir = base_dir
+        self.archive_after = archive_after_hours * 60 * 60
+        self.retention = retention_days * 24 * 60 * 60
+        self.bundle_max_size = bundle_max_mb * 1024 * 1024
+
+    def run(self):
+        """Архивация и очистка по всем каналам"""
+        try:
+            channels = os.listdir(self.base_dir)
+        except Exception as e:
+            logger.error(f"Failed to list channels for archiving: {e}")
+            return
+
+        for channel in channels:
+            if not os.path.isdir(os.path.join(self.base_dir, channel)):
+                continue
+            try:
+                self.archive_channel(channel)
+                self.enforce_retention(channel)
+            except Exception as e:
+                logger.error(f"Failed to archive channel {channel}: {e}")
+
+    def archive_channel(self, channel_name: str) -> int:
+        """Упаковывает группы из done/, опубликованные раньше порога"""
+        done_dir = os.path.join(self.base_dir, channel_name, "done")
+        if not os.path.isdir(done_dir):
+            return 0
+
+        cutoff = time.time() - self.archive_after
+        groups: Dict[str, List[os.DirEntry]] = {}
+        with os.scandir(done_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    groups.setdefault(post_number(entry.name), []).append(entry)
+
+        # Группа архивируется целиком, когда самый свежий её файл старше порога
+        old_groups = {
+            number: files
+            for number, files in groups.items()
+            if max(f.stat().st_mtime for f in files) < cutoff
+        }
+        if not old_groups:
+            return 0
+
+        archive_dir = self._archive_dir(channel_name)
+        os.makedirs(archive_dir, exist_ok=True)
+
+        archived = 0
+        bundle_path = self._current_bundle(archive_dir)
+        index = self._load_index(bundle_path)
+        pending: List[os.DirEntry] = []
+        bundle = open(bundle_path, "ab")
+        try:
+            for number in sorted(old_groups):
+                if bundle.tell() >= self.bundle_max_size:
+                    self._commit(bundle, bundle_path, index, pending)
+                    bundle.close()
+                    bundle_path = self._new_bundle(archive_dir)
+                    index = self._load_index(bundle_path)
+                    bundle = open(bundle_path, "ab")
+
+                files = sorted(old_groups[number], key=lambda f: f.name)
+                offset = bundle.tell()
+                with tarfile.open(fileobj=bundle, mode="w:gz") as tar:
+                    for file in files:
+                        tar.add(file.path, arcname=file.name)
+
+                published_at = max(f.stat().st_mtime for f in files)
+                index["posts"][number] = {
+                    "offset": offset,
+                    "length": bundle.tell() - offset,
+                    "published_at": published_at,
+                    "files": [f.name for f in files],
+                }
+                index["max_published_at"] = max(
+                    index.get("max_published_at", 0), published_at
+                )
+                pending.extend(files)
+                archived += 1
+
+            self._commit(bundle, bundle_path, index, pending)
+        finally:
+            bundle.close()
+
+        logger.info(f"Archived {archived} posts for channel {channel_name}")
+        return archived
+
+    def enforce_retention(self, channel_name: str) -> int:
+        """Удаляет бандлы, все посты которых старше срока хранения"""
+        archive_dir = self._archive_dir(channel_name)
+        if not os.path.isdir(archive_dir):
+            return 0
+
+        cutoff = time.time() - self.retention
+        removed = 0
+        for bundle_path in self._bundles(archive_dir):
+            index = self._load_index(bundle_path)
+            if index.get("max_published_at", 0) < cutoff:
+                os.remove(bundle_path)
+                if os.path.exists(bundle_path + INDEX_SUFFIX):
+                    os.remove(bundle_path + INDEX_SUFFIX)
+                logger.info(f"Removed expired bundle {bundle_path}")
+                removed += 1
+        return removed
+
+    def find_post(self, channel_name: str, number: str) -> Optional[dict]:
+        """Ищет пост в индексах бандлов канала"""
+        archive_dir = self._archive_dir(channel_name)
+        if not os.path.isdir(archive_dir):
+            return None
+
+        for bundle_path in reversed(self._bundles(archive_dir)):
+            entry = self._load_index(bundle_path)["posts"].get(number)
+            if entry:
+                return {"bundle": bundle_path, **entry}
+        return None
+
+    def iter_post(
+        self, channel_name: str, number: str, chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """Потоково отдаёт пост из архива в виде tar.gz"""
+        entry = self.find_post(channel_name, number)
+        if entry is None:
+            raise ArchivedPostNotFound(
+                f"Post {number} not found in archive of channel {channel_name}"
+            )
+
+        with open(entry["bundle"], "rb") as bundle:
+            bundle.seek(entry["offset"])
+            remaining = entry["length"]
+            while remaining > 0:
+                chunk = bundle.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def _archive_dir(self, channel_name: str) -> str:
+        return os.path.join(self.base_dir, channel_name, "archive")
+
+    def _bundles(self, archive_dir: str) -> List[str]:
+        return sorted(
+            os.path.join(archive_dir, name)
+            for name in os.listdir(archive_dir)
+            if name.endswith(BUNDLE_SUFFIX)
+        )
+
+    def _commit(self, bundle, bundle_path: str, index: dict, pending: list):
+        """Сбрасывает бандл на диск, пишет индекс и только потом удаляет исходники"""
+        bundle.flush()
+        os.fsync(bundle.fileno())
+        self._save_index(bundle_path, index)
+        for file in pending:
+            os.remove(file.path)
+        pending.clear()
+
+    def _current_bundle(self, archive_dir: str) -> str:
+        bundles = self._bundles(archive_dir)
+        if bundles and os.path.getsize(bundles[-1]) < self.bundle_max_size:
+            return bundles[-1]
+        return self._new_bundle(archive_dir)
+
+    @staticmethod
+    def _new_bundle(archive_dir: str) -> str:
+        name = time.strftime("%Y%m%d%H%M%S") + f"_{time.time_ns() % 10**9:09d}"
+        return os.path.join(archive_dir, name + BUNDLE_SUFFIX)
+
+    @staticmethod
+    def _load_index(bundle_path: str) -> dict:
+        index_path = bundle_path + INDEX_SUFFIX
+        if not os.path.exists(index_path):
+            return {"posts": {}}
+        with open(index_path, "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _save_index(bundle_path: str, index: dict):
+        index_path = bundle_path + INDEX_SUFFIX
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
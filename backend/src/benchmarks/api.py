@@ -0,0 +1,148 @@
+"""Задержка и объём ответа /channels/get_all на 1k/10k каналов.
+
+Сравнивает прежний путь (pydantic-модели из x.__dict__ и стандартный
+JSON-кодировщик FastAPI) с текущим (строки таблицы -> orjson) и размеры
+ответа без сжатия, с gzip и brotli. Запросы идут в приложение напрямую
+через ASGI, без сети: замеряется только работа бэкенда.
+
+Запуск из backend/src:
+    python -m benchmarks.api --channels 1000 10000 --repeat 20 --output api.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+AUTH = ("ADMIN", "bench")
+
+
+def configure_environment(workdir: str):
+    """Настройки задаются до импорта модулей бэкенда: они читают cfg при импорте"""
+    os.makedirs(os.path.join(workdir, "channels"), exist_ok=True)
+    os.environ.update(
+        {
+            "DEBUG": "false",
+            "BOT_TOKEN": "123456:bench",
+            "BASE_DIR": os.path.join(workdir, "channels"),
+            "LOGS_PATH": workdir,
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "USERNAME": AUTH[0],
+            "PASSWORD": AUTH[1],
+        }
+    )
+
+
+def fill_channels(count: int):
+    """Пересоздаёт таблицу каналов с count строками"""
+    from sqlalchemy import delete, insert
+
+    from database import create_tables, session_factory
+    from models import ChannelORM
+
+    create_tables()
+    with session_factory() as session:
+        session.execute(delete(ChannelORM))
+        session.execute(
+            insert(ChannelORM),
+            [
+                {
+                    "name": f"bench_{c:05d}",
+                    "chat_id": -(10**12) - c,
+                    "interval": 60,
+                    "parse_mode": "html",
+                    "active": c % 2 == 0,
+                    "posting_window": "* 9-21 * * *" if c % 3 == 0 else None,
+                    "duplicate_policy": "allow",
+                    "path_to_source_dir": f"/channels/bench_{c:05d}/source",
+                    "path_to_except_dir": f"/channels/bench_{c:05d}/except",
+                    "path_to_done_dir": f"/channels/bench_{c:05d}/done",
+                }
+                for c in range(count)
+            ],
+        )
+        session.commit()
+
+
+def legacy_app():
+    """Прежний обработчик get_all без мидлвари сжатия"""
+    from fastapi import FastAPI
+
+    from channels.schemas import Channel, Channels
+    from repository import ChannelRepository
+
+    app = FastAPI()
+
+    @app.get("/channels/get_all")
+    async def get_all() -> Channels:
+        res = ChannelRepository.get_all()
+        return Channels(channels=[Channel.model_validate(x.__dict__) for x in res])
+
+    return app
+
+
+async def measure(app, encoding: str, repeat: int) -> dict:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Accept-Encoding": encoding}
+    timings = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = await c.get("/channels/get_all", headers=headers, auth=AUTH)
+            timings.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    timings.sort()
+    return {
+        "encoding": encoding,
+        "content_encoding": response.headers.get("content-encoding", "identity"),
+        "bytes": response.num_bytes_downloaded,
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+    }
+
+
+async def run(args) -> list:
+    from main import app
+
+    results = []
+    for count in args.channels:
+        fill_channels(count)
+        variants = [("legacy", legacy_app(), "identity")] + [
+            ("current", app, encoding) for encoding in ("identity", "gzip", "br")
+        ]
+        for name, variant_app, encoding in variants:
+            result = await measure(variant_app, encoding, args.repeat)
+            results.append({"channels": count, "variant": name, **result})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--channels", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="Файл для JSON с результатами")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="autopost-api-") as tmp:
+        configure_environment(tmp)
+        # loguru пишет каждый запрос в stderr, в замере это лишний шум
+        from loguru import logger
+
+        logger.remove()
+        results = asyncio.run(run(args))
+
+    result = {"params": vars(args), "results": results}
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Сжатие больших JPEG: прежний thumbnail против draft-режима Pillow.
+
+Варианты:
+    full          - прежний путь: thumbnail() с параметрами по умолчанию.
+                    Pillow сам вызывает draft() с reducing_gap=2.0, так что
+                    это не полный декод, а базовая линия приложения.
+    full_no_draft - thumbnail(reducing_gap=None): честный полный декод,
+                    верхняя граница по памяти и времени.
+    draft         - текущий publishing.compress_image.
+
+Каждый вариант запускается в отдельном процессе, чтобы пиковая память
+(ru_maxrss) не смешивалась между вариантами. Память Pillow выделяется
+в C, tracemalloc её не видит, поэтому меряется RSS процесса.
+
+Запуск из backend/src:
+    python -m benchmarks.compress_image --megapixels 40 --repeat 3 --output img.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import resource
+import tempfile
+import time
+
+MAX_SIDE = 1920
+
+
+def _thumbnail(file_path: str, output_path: str, **kwargs):
+    from PIL import Image
+
+    with Image.open(file_path) as img:
+        if img.mode in ("RGBA", "P"):
+            img = img.convert("RGB")
+        img.thumbnail((MAX_SIDE, MAX_SIDE), Image.Resampling.LANCZOS, **kwargs)
+        img.save(output_path, format="JPEG", quality=85)
+
+
+def full_decode(file_path: str, output_path: str):
+    """Прежний путь приложения: thumbnail с параметрами по умолчанию"""
+    _thumbnail(file_path, output_path)
+
+
+def full_no_draft_decode(file_path: str, output_path: str):
+    """Декод в полном разрешении без draft(), затем thumbnail"""
+    _thumbnail(file_path, output_path, reducing_gap=None)
+
+
+def draft_decode(file_path: str, output_path: str):
+    from publishing import compress_image
+
+    os.replace(compress_image(file_path, MAX_SIDE), output_path)
+
+
+VARIANTS = {
+    "full": full_decode,
+    "full_no_draft": full_no_draft_decode,
+    "draft": draft_decode,
+}
+
+
+def measure(variant: str, file_path: str, repeat: int, queue):
+    from PIL import Image  # noqa: F401 - импорт не должен попасть в замер
+
+    import publishing  # noqa: F401
+
+    func = VARIANTS[variant]
+    output_path = os.path.join(os.path.dirname(file_path), f"out-{variant}.jpg")
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    wall = []
+    cpu = []
+    for _ in range(repeat):
+        started_wall = time.perf_counter()
+        started_cpu = time.process_time()
+        func(file_path, output_path)
+        wall.append(time.perf_counter() - started_wall)
+        cpu.append(time.process_time() - started_cpu)
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put(
+        {
+            "variant": variant,
+            "wall_ms": {"min": min(wall) * 1000, "mean": sum(wall) / repeat * 1000},
+            "cpu_ms": {"min": min(cpu) * 1000, "mean": sum(cpu) / repeat * 1000},
+            "peak_rss_mb": peak_rss / 1024,
+            "peak_rss_over_baseline_mb": (peak_rss - baseline_rss) / 1024,
+            "output_kb": os.path.getsize(output_path) / 1024,
+        }
+    )
+
+
+def collect(process, queue, timeout: float) -> dict:
+    """Результат варианта; упавший или зависший процесс - ошибка, а не вечное ожидание"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return queue.get(timeout=1)
+        except queue_module.Empty:
+            if not process.is_alive():
+                break
+    if process.is_alive():
+        process.kill()
+    process.join()
+    raise SystemExit(
+        f"{process.name} produced no result (exit code {process.exitcode})"
+    )
+
+
+def generate_image(path: str, megapixels: float, orientation: int):
+    """Шумное фото 3:2 нужного размера; шум плохо сжимается, как реальные фото"""
+    from PIL import Image
+
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = int(width * 2 / 3)
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    exif = Image.Exif()
+    if orientation != 1:
+        exif[0x0112] = orientation
+    image.save(path, format="JPEG", quality=95, exif=exif)
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megapixels", type=float, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--orientation", type=int, default=6, help="EXIF Orientation исходника"
+    )
+    parser.add_argument("--output", help="Файл для JSON с результатами")
+    parser.add_argument(
+        "--timeout", type=float, default=600, help="Секунд на один вариант"
+    )
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="autopost-img-") as tmp:
+        # compress_image пишет копию в <канал>/temp, эмулируем структуру канала
+        source = os.path.join(tmp, "channel", "source")
+        os.makedirs(source)
+        file_path = os.path.join(source, "0001_1.jpg")
+        width, height = generate_image(file_path, args.megapixels, args.orientation)
+
+        results = []
+        for variant in VARIANTS:
+            queue = ctx.Queue()
+            process = ctx.Process(
+                target=measure,
+                args=(variant, file_path, args.repeat, queue),
+                name=f"variant {variant}",
+            )
+            process.start()
+            results.append(collect(process, queue, args.timeout))
+            process.join()
+            if process.exitcode != 0:
+                raise SystemExit(f"Variant {variant} exited with {process.exitcode}")
+
+        result = {
+            "params": vars(args),
+            "source": {
+                "size": f"{width}x{height}",
+                "mb": os.path.getsize(file_path) / 1024 / 1024,
+            },
+            "results": results,
+        }
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
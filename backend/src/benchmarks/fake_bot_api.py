@@ -0,0 +1,220 @@
+"""Локальный фейковый Bot API для бенчмарков.
+
+Отвечает на методы, которые использует CustomBot, с настраиваемой задержкой
+и долей ответов 429. Загрузки читаются целиком, чтобы нагрузка на сеть была
+как у настоящего сервера.
+
+Отдельный запуск из backend/src:
+    python -m benchmarks.fake_bot_api --port 8081 --latency-ms 50 --rate-429 0.01
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+
+
+class FakeBotAPI:
+    def __init__(
+        self,
+        latency_ms: float = 50,
+        jitter_ms: float = 10,
+        rate_429: float = 0.0,
+        retry_after: int = 1,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.message_ids = itertools.count(1)
+        self.stats = {
+            "requests": 0,
+            "too_many_requests": 0,
+            "bytes_received": 0,
+            "methods": {},
+            "bots": {},
+        }
+        self.app = web.Application(client_max_size=1024**3)
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.stats["requests"] += 1
+        self.stats["methods"][method] = self.stats["methods"].get(method, 0) + 1
+        # Запросы по ботам пула: id бота - часть токена до двоеточия
+        bot_id = request.match_info["token"].split(":", 1)[0]
+        self.stats["bots"][bot_id] = self.stats["bots"].get(bot_id, 0) + 1
+
+        fields = await self._read_fields(request)
+
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(delay, 0) / 1000)
+
+        if self.rate_429 and random.random() < self.rate_429:
+            self.stats["too_many_requests"] += 1
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                },
+                # aiogram определяет 429 и 404 по HTTP-статусу ответа
+                status=429,
+            )
+
+        handler = getattr(self, f"method_{method}", None)
+        if handler is None:
+            return web.json_response(
+                {"ok": False, "error_code": 404, "description": "Not Found"},
+                status=404,
+            )
+        return web.json_response({"ok": True, "result": handler(fields)})
+
+    async def _read_fields(self, request: web.Request) -> dict:
+        fields = {}
+        if request.content_type.startswith("multipart/"):
+            reader = await request.multipart()
+            async for part in reader:
+                size = 0
+                chunks = []
+                while chunk := await part.read_chunk():
+                    size += len(chunk)
+                    if part.filename is None:
+                        chunks.append(chunk)
+                self.stats["bytes_received"] += size
+                if part.filename is None:
+                    fields[part.name] = b"".join(chunks).decode()
+        else:
+            body = await request.read()
+            self.stats["bytes_received"] += len(body)
+            if request.content_type == "application/json" and body:
+                fields = json.loads(body)
+            elif body:
+                fields = dict(await request.post())
+        return fields
+
+    def _message(self, chat_id, **extra) -> dict:
+        message_id = next(self.message_ids)
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "channel"},
+            **extra,
+        }
+
+    def method_getMe(self, fields: dict) -> dict:
+        return {
+            "id": 1,
+            "is_bot": True,
+            "first_name": "Bench",
+            "username": "bench_bot",
+        }
+
+    def method_sendMessage(self, fields: dict) -> dict:
+        return self._message(fields.get("chat_id", 0), text=fields.get("text", ""))
+
+    def _media_message(self, chat_id, kind: str, caption=None) -> dict:
+        """Сообщение с загруженным файлом: file_id нужен для повторной отправки"""
+        message_id = next(self.message_ids)
+        file = {"file_id": f"fake-{message_id}", "file_unique_id": f"fake-{message_id}"}
+        if kind == "photo":
+            media = [{**file, "width": 1280, "height": 1280}]
+        elif kind in ("video", "animation"):
+            media = {**file, "width": 1280, "height": 720, "duration": 10}
+        else:
+            media = file
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "channel"},
+            kind: media,
+            "caption": caption,
+        }
+
+    def method_sendMediaGroup(self, fields: dict) -> list:
+        media = json.loads(fields.get("media", "[]"))
+        return [
+            self._media_message(
+                fields.get("chat_id", 0), item.get("type", "photo"), item.get("caption")
+            )
+            for item in media
+        ]
+
+    def method_sendPhoto(self, fields: dict) -> dict:
+        return self._media_message(
+            fields.get("chat_id", 0), "photo", fields.get("caption")
+        )
+
+    def method_sendVideo(self, fields: dict) -> dict:
+        return self._media_message(
+            fields.get("chat_id", 0), "video", fields.get("caption")
+        )
+
+    def method_sendAnimation(self, fields: dict) -> dict:
+        return self._media_message(
+            fields.get("chat_id", 0), "animation", fields.get("caption")
+        )
+
+    def method_sendDocument(self, fields: dict) -> dict:
+        return self._media_message(
+            fields.get("chat_id", 0), "document", fields.get("caption")
+        )
+
+    def method_getChatMember(self, fields: dict) -> dict:
+        return {
+            "status": "administrator",
+            "user": self.method_getMe(fields),
+            "can_be_edited": False,
+            "is_anonymous": False,
+            "can_manage_chat": True,
+            "can_delete_messages": True,
+            "can_manage_video_chats": True,
+            "can_restrict_members": True,
+            "can_promote_members": False,
+            "can_change_info": True,
+            "can_invite_users": True,
+            "can_post_stories": True,
+            "can_edit_stories": True,
+            "can_delete_stories": True,
+            "can_post_messages": True,
+        }
+
+
+async def serve(args):
+    api = FakeBotAPI(args.latency_ms, args.jitter_ms, args.rate_429, args.retry_after)
+    await api.start(args.host, args.port)
+    print(f"Fake Bot API listening on http://{args.host}:{args.port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    asyncio.run(serve(parser.parse_args()))
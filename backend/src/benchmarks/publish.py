@@ -0,0 +1,224 @@
+"""Сквозной бенчмарк публикации на синтетических каналах.
+
+Генерирует дерево каналов (каналы x группы x изображения), поднимает
+фейковый Bot API и гоняет настоящий планировщик и конвейер публикации,
+пока все группы не покинут source (done или except) и не закончатся
+отложенные повторы. Результат - JSON для сравнения между коммитами.
+
+Запуск из backend/src:
+    python -m benchmarks.publish --channels 50 --groups 5 --images 3 \\
+        --image-size 3000x2000 --latency-ms 50 --rate-429 0.01 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+from benchmarks.fake_bot_api import FakeBotAPI, add_arguments
+
+
+def configure_environment(workdir: str, args):
+    """Настройки задаются до импорта модулей бэкенда: они читают cfg при импорте"""
+    os.makedirs(os.path.join(workdir, "channels"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+    os.environ.update(
+        {
+            "DEBUG": "false",
+            "BOT_TOKEN": "123456:bench",
+            "BOT_API_URL": f"http://127.0.0.1:{args.port}",
+            "BASE_DIR": os.path.join(workdir, "channels"),
+            "LOGS_PATH": os.path.join(workdir, "logs"),
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "SCHEDULER_ENGINE": "heap",
+        }
+    )
+
+
+def generate_channels(args) -> int:
+    """Каналы с группами 0000.txt + 0000_N.jpg; возвращает число постов"""
+    from PIL import Image
+
+    from channels_files import ChannelsFileManager
+    from database import create_tables
+    from models import ChannelORM
+    from repository import ChannelRepository
+    from settings import get_settings
+
+    cfg = get_settings()
+    create_tables()
+    filemanager = ChannelsFileManager(base_dir=cfg.base_dir)
+
+    width, height = (int(x) for x in args.image_size.split("x"))
+    # Шум плохо сжимается, поэтому JPEG получается реалистичного размера
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    sample = os.path.join(cfg.base_dir, "sample.jpg")
+    image.save(sample, format="JPEG", quality=95)
+
+    for c in range(args.channels):
+        name = f"bench_{c:05d}"
+        filemanager.create_channel(name)
+        source = os.path.join(cfg.base_dir, name, "source")
+        for g in range(args.groups):
+            with open(os.path.join(source, f"{g:04d}.txt"), "w") as f:
+                f.write(f"Benchmark post {g} of channel {name}")
+            for i in range(args.images):
+                os.link(sample, os.path.join(source, f"{g:04d}_{i + 1}.jpg"))
+
+        ChannelRepository.add(
+            ChannelORM(
+                name=name,
+                chat_id=-(10**12) - c,
+                interval=1,
+                parse_mode="html",
+                active=True,
+                path_to_source_dir=source,
+                path_to_except_dir=os.path.join(cfg.base_dir, name, "except"),
+                path_to_done_dir=os.path.join(cfg.base_dir, name, "done"),
+            )
+        )
+
+    os.remove(sample)
+    return args.channels * args.groups
+
+
+class LoopLagMonitor:
+    """Задержка цикла событий: насколько позже просыпается sleep(interval)"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - started - self.interval)
+
+    def summary(self) -> dict:
+        values = sorted(self.samples) or [0.0]
+        return {
+            "p50_ms": values[len(values) // 2] * 1000,
+            "p99_ms": values[min(len(values) - 1, int(len(values) * 0.99))] * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+
+
+def count_groups(base_dir: str, folder: str) -> int:
+    """Групп в папке всех каналов: у каждой группы ровно один .txt"""
+    return sum(
+        len([file for file in os.listdir(path) if file.endswith(".txt")])
+        for name in os.listdir(base_dir)
+        if os.path.isdir(path := os.path.join(base_dir, name, folder))
+    )
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args) -> dict:
+    api = FakeBotAPI(args.latency_ms, args.jitter_ms, args.rate_429, args.retry_after)
+    await api.start(port=args.port)
+
+    import scheduler
+    from settings import get_settings
+
+    cfg = get_settings()
+    total_posts = generate_channels(args)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    scheduler.start_scheduler()
+    await scheduler.add_tasks()
+
+    # Все каналы стартуют сразу и тикают с периодом --tick вместо минут
+    started = time.perf_counter()
+    now = time.time()
+    for job in scheduler.heap_scheduler.get_jobs():
+        job.interval = args.tick
+        scheduler.heap_scheduler.reschedule_job(job.id, now)
+
+    # finalize считает и попытки, ушедшие на повтор, поэтому ждём,
+    # пока группы не покинут source и не останется отложенных повторов
+    pipeline = scheduler.get_pipeline()
+    while (
+        await asyncio.to_thread(count_groups, cfg.base_dir, "source")
+        or pipeline.pending_retries()
+    ):
+        if time.perf_counter() - started > args.timeout:
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    monitor.stop()
+    summary = pipeline.summary()
+    await scheduler.stop_scheduler()
+    await api.stop()
+
+    published = count_groups(cfg.base_dir, "done")
+
+    return {
+        "commit": git_commit(),
+        "params": vars(args),
+        "posts_total": total_posts,
+        "posts_published": published,
+        "posts_failed": count_groups(cfg.base_dir, "except"),
+        "elapsed_s": elapsed,
+        "posts_per_s": published / elapsed,
+        "stages": summary,
+        "loop_lag": monitor.summary(),
+        "rss_mb": current_rss_mb(),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "api": api.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--groups", type=int, default=5)
+    parser.add_argument("--images", type=int, default=3)
+    parser.add_argument("--image-size", default="1920x1280")
+    parser.add_argument("--tick", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--workdir", help="Каталог для дерева каналов и БД")
+    parser.add_argument("--output", help="Файл для JSON с результатами")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="autopost-bench-") as tmp:
+        configure_environment(args.workdir or tmp, args)
+        result = asyncio.run(run(args))
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Сравнение APScheduler и HeapScheduler на 1k/10k/100k каналов.
+
+Запуск из backend/src:
+    python -m benchmarks.scheduler_engines --sizes 1000 10000 100000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+from heap_scheduler import HeapScheduler
+
+INTERVAL_MINUTES = 240
+
+
+class Counter:
+    def __init__(self, total: int):
+        self.total = total
+        self.count = 0
+        self.done = asyncio.Event()
+
+    async def job(self):
+        self.count += 1
+        if self.count >= self.total:
+            self.done.set()
+
+
+async def bench_apscheduler(n: int) -> dict:
+    counter = Counter(n)
+    scheduler = AsyncIOScheduler(
+        job_defaults={"misfire_grace_time": None, "coalesce": True}
+    )
+    scheduler.start(paused=True)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    now = datetime.now(scheduler.timezone)
+    for i in range(n):
+        scheduler.add_job(
+            counter.job,
+            trigger=IntervalTrigger(minutes=INTERVAL_MINUTES),
+            id=str(i),
+            next_run_time=now,
+        )
+    add_s = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    scheduler.resume()
+    await counter.done.wait()
+    dispatch_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(n):
+        scheduler.remove_job(str(i))
+    remove_s = time.perf_counter() - started
+
+    scheduler.shutdown(wait=False)
+    return {
+        "add_s": add_s,
+        "dispatch_s": dispatch_s,
+        "remove_s": remove_s,
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+async def bench_heap(n: int) -> dict:
+    counter = Counter(n)
+    scheduler = HeapScheduler()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    now = time.time()
+    for i in range(n):
+        scheduler.add_job(
+            counter.job,
+            interval=INTERVAL_MINUTES * 60,
+            id=str(i),
+            next_run_time=now,
+        )
+    add_s = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    scheduler.start()
+    await counter.done.wait()
+    dispatch_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(n):
+        scheduler.remove_job(str(i))
+    remove_s = time.perf_counter() - started
+
+    scheduler.shutdown()
+    return {
+        "add_s": add_s,
+        "dispatch_s": dispatch_s,
+        "remove_s": remove_s,
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+async def main(sizes):
+    results = []
+    for n in sizes:
+        for engine, bench in (("apscheduler", bench_apscheduler), ("heap", bench_heap)):
+            result = await bench(n)
+            results.append({"engine": engine, "channels": n, **result})
+            print(json.dumps(results[-1]), flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--output", help="Файл для JSON с результатами")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args.sizes))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -3,28 +3,47 @@ from typing import List
 
 from aiogram import Bot
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
-from aiogram.types import FSInputFile, InputMediaPhoto
+from aiogram.types import InputMedia
 from loguru import logger
 
 from settings import get_settings
 
 
 class CustomBot(Bot):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, token: str | None = None, **kwargs):
 
         cfg = get_settings()
-        token = cfg.bot_token
+        token = token or cfg.bot_token
         default = DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
+        if cfg.bot_api_url and "session" not in kwargs:
+            kwargs["session"] = AiohttpSession(
+                api=TelegramAPIServer.from_base(cfg.bot_api_url)
+            )
         super().__init__(token, default=default, *args, **kwargs)
         logger.success("bot created successfully")
 
-    async def send_post(self, channel_id: int | str, media: List[InputMediaPhoto]):
+    async def send_post(self, channel_id: int | str, media: List[InputMedia]):
         logger.info("Sending post to channel")
-        await self.send_media_group(channel_id, media=media)
-        await self.session.close()
+        # Сессия переиспользуется между постами, закрывает её владелец бота
+        if len(media) == 1:
+            # Одиночный файл и анимация уходят своим методом, не альбомом
+            item = media[0]
+            send = {
+                "photo": self.send_photo,
+                "video": self.send_video,
+                "animation": self.send_animation,
+                "document": self.send_document,
+            }[item.type]
+            messages = [await send(channel_id, item.media, caption=item.caption)]
+        else:
+            messages = await self.send_media_group(channel_id, media=media)
         logger.info("Post send successfully")
-        return True
+        # Сообщения нужны для file_id загруженных файлов
+        return messages
+
 
 if __name__ == "__main__":
     bot = CustomBot()
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from models import ChannelORM
+from settings import Settings, get_settings
+
+if TYPE_CHECKING:
+    from bot import CustomBot
+
+cfg: Settings = get_settings()
+
+
+class RateLimiter:
+    """Token bucket: не больше `rate` операций в секунду с запасом `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def bot_tokens() -> Dict[str, str]:
+    """Пул токенов: id бота (число до двоеточия) -> токен, основной первым"""
+    tokens = {}
+    for token in [cfg.bot_token, *cfg.bot_tokens]:
+        if token:
+            tokens.setdefault(token.split(":", 1)[0], token)
+    return tokens
+
+
+def primary_bot_id() -> str:
+    return next(iter(bot_tokens()))
+
+
+def resolve_bot_id(channel: ChannelORM) -> str:
+    """Бот канала; назначение на бота, которого нет в пуле, не действует"""
+    bot_id = getattr(channel, "bot_id", None)
+    if bot_id and bot_id in bot_tokens():
+        return bot_id
+    return primary_bot_id()
+
+
+def least_loaded(loads: Dict[str, int], bot_ids: Optional[List[str]] = None) -> str:
+    """Бот с наименьшим числом каналов (при равенстве - раньше в пуле)"""
+    return min(bot_ids or bot_tokens(), key=lambda bot_id: loads.get(bot_id, 0))
+
+
+def assign_bots(
+    channels: List[ChannelORM],
+    loads: Dict[str, int],
+    verified: Callable[[int, str], bool] = lambda chat_id, bot_id: False,
+) -> List[ChannelORM]:
+    """Назначает ботов каналам без (живого) назначения.
+
+    Основной бот постил во все каналы до появления пула, поэтому канал
+    закрепляется за ним; другой бот пула выбирается, только если verified
+    подтвердил его права в этом чате. loads обновляется на месте;
+    возвращает каналы, которые нужно сохранить.
+    """
+    pool = bot_tokens()
+    primary = primary_bot_id()
+    changed = []
+    for channel in channels:
+        if channel.bot_id in pool:
+            continue
+        candidates = [
+            bot_id
+            for bot_id in pool
+            if bot_id == primary or verified(channel.chat_id, bot_id)
+        ]
+        channel.bot_id = least_loaded(loads, candidates)
+        loads[channel.bot_id] = loads.get(channel.bot_id, 0) + 1
+        changed.append(channel)
+    if changed:
+        logger.info(f"Assigned bots to {len(changed)} channels, load: {loads}")
+    return changed
+
+
+class BotPool:
+    """Боты пула со своими сессиями и лимитом запросов у каждого.
+
+    Лимиты Telegram считаются на бота, поэтому суммарная скорость
+    отправки растёт с числом токенов.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.bots: Dict[str, "CustomBot"] = {}
+        self.limiters: Dict[str, RateLimiter] = {}
+
+    def get(self, bot_id: str) -> "CustomBot":
+        if bot_id not in self.bots:
+            # aiogram тяжёлый, импортируем его при первом обращении
+            from bot import CustomBot
+
+            self.bots[bot_id] = CustomBot(token=bot_tokens()[bot_id])
+        return self.bots[bot_id]
+
+    def limiter(self, bot_id: str) -> RateLimiter:
+        if bot_id not in self.limiters:
+            self.limiters[bot_id] = RateLimiter(self.rate)
+        return self.limiters[bot_id]
+
+    async def close(self):
+        for bot in self.bots.values():
+            await bot.session.close()
+        self.bots.clear()
+        # Лимитеры привязаны к циклу событий
+        self.limiters.clear()
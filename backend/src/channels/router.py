@@ -1,16 +1,32 @@
+import asyncio
 import os
+from typing import Dict, List, Literal, Optional
 
-import aiogram.exceptions
-from aiogram.enums import ChatMemberStatus
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from loguru import logger
 
+from archive import DoneArchiver
 from auth.tools import authenticate_user
-from bot import CustomBot
-from channels.schemas import Channel, Channels, NewChannel
-from channels_files import ChannelExists, ChannelsFileManager
+from bot_pool import bot_tokens, resolve_bot_id
+from channels.schemas import (
+    Channel,
+    Channels,
+    CheckChannels,
+    DeadLetter,
+    FilePage,
+    NewChannel,
+    RequeueDeadLetters,
+)
+from channels_files import (
+    ChannelBroken,
+    ChannelExists,
+    ChannelNotFound,
+    ChannelsFileManager,
+)
 from models import ChannelORM
-from repository import ChannelRepository
+from permissions import permission_checker
+from repository import ChannelRepository, DeadLetterRepository
 from scheduler import add_posting_task, deactivate_channel, posting
 from settings import Settings, get_settings
 
@@ -19,17 +35,18 @@ router = APIRouter(prefix="/channels", tags=["channels"])
 cfg: Settings = get_settings()
 
 
-@router.get("/get_all")
-async def get_all(authorized: bool = Depends(authenticate_user)) -> Channels:
+@router.get("/get_all", response_model=Channels)
+async def get_all(authorized: bool = Depends(authenticate_user)):
     if not authorized:
         logger.warning("Unauthorized access attempt for /get_all")
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     try:
-        res = ChannelRepository.get_all()
-        channels = [Channel.model_validate(x.__dict__) for x in res]
+        # Столбцы таблицы совпадают со схемой Channel: строки отдаются
+        # напрямую, без pydantic-моделей и повторной валидации ответа
+        channels = ChannelRepository.get_all_rows()
         logger.info("Fetched all channels successfully")
-        return Channels(channels=channels)
+        return ORJSONResponse({"channels": channels})
     except Exception as e:
         logger.error(f"Error fetching channels: {e}")
         raise HTTPException(status_code=500, detail="Error fetching channels")
@@ -49,7 +66,7 @@ async def get_by_id(
             logger.warning(f"Channel with ID {id} not found")
             return None
         logger.info(f"Channel with ID {id} fetched successfully")
-        return Channel.model_validate(channel.__dict__)
+        return Channel.model_validate(channel)
     except Exception as e:
         logger.error(f"Error fetching channel {id}: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching channel {id}")
@@ -104,6 +121,9 @@ async def delete_channel(id: int, authorized: bool = Depends(authenticate_user))
             logger.warning(f"Channel with ID {id} not found for deletion")
             raise HTTPException(status_code=404, detail="Channel not found")
 
+        if channel.active:
+            deactivate_channel(channel)
+
         channel_name = channel.name
         ChannelRepository.delete(id)
 
@@ -127,24 +147,20 @@ async def update_channel(
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     try:
-        data = channel.model_dump()
         existing_channel: ChannelORM = ChannelRepository.get(id)
+        if not existing_channel:
+            logger.warning(f"Channel with ID {id} not found for update")
+            raise HTTPException(status_code=404, detail="Channel not found")
 
         if existing_channel.active:
             deactivate_channel(existing_channel)
-            data["active"] = False
 
-        data["id"] = id
-        data["path_to_source_dir"] = existing_channel.path_to_source_dir
-        data["path_to_except_dir"] = existing_channel.path_to_except_dir
-        data["path_to_done_dir"] = existing_channel.path_to_done_dir
-        data["active"] = False
+        # Поля, которых нет в запросе (форма шлёт не все), остаются как были
+        for key, value in channel.model_dump(exclude_unset=True).items():
+            setattr(existing_channel, key, value)
+        existing_channel.active = False
 
-        if not existing_channel:
-            logger.warning(f"Channel with ID {id} not found for update")
-            raise HTTPException(status_code=404, detail="Channel not found")
-
-        ChannelRepository.update(ChannelORM(**data))
+        ChannelRepository.update(existing_channel)
         logger.info(f"Channel with ID {id} updated successfully")
         return {"status": "ok"}
 
@@ -164,8 +180,10 @@ async def on_channel(id: int, authorized: bool = Depends(authenticate_user)):
             if channel:
                 channel.active = True
                 ChannelRepository.update(channel)
-                await posting(channel)
-                add_posting_task(channel)
+                # В режиме workers канал подхватит свой шард
+                # Сразу постит только владелец аренды, иначе группа уйдёт дважды
+                if cfg.posting_mode == "api" and await add_posting_task(channel):
+                    await posting(channel)
             else:
                 raise HTTPException(status_code=404, detail="Channel not found")
 
@@ -193,28 +211,183 @@ async def off_channel(id: int, authorized: bool = Depends(authenticate_user)):
             raise HTTPException(status_code=500, detail=f"Error updating channel {id}")
 
 
+def channel_bot_ids(chat_ids: List[int], bot_id: Optional[str]) -> Dict[int, str]:
+    """Каким ботом проверять чат: заданным, ботом канала или основным"""
+    if bot_id is not None:
+        if bot_id not in bot_tokens():
+            raise HTTPException(status_code=400, detail=f"Unknown bot {bot_id}")
+        return {chat_id: bot_id for chat_id in chat_ids}
+
+    wanted = set(chat_ids)
+    return {
+        channel.chat_id: resolve_bot_id(channel)
+        for channel in ChannelRepository.get_all()
+        if channel.chat_id in wanted
+    }
+
+
 @router.post("/check/{chat_id}")
-async def check(chat_id: int, authorized: bool = Depends(authenticate_user)):
+async def check(
+    chat_id: int,
+    bot_id: str | None = None,
+    authorized: bool = Depends(authenticate_user),
+):
     if not authorized:
         logger.warning(f"Unauthorized access attempt for /check/{chat_id}")
         raise HTTPException(status_code=401, detail="Unauthorized")
     else:
-        try:
-            bot = CustomBot()
-            # Получаем информацию о члене чата (в данном случае о боте)
-            chat_member = await bot.get_chat_member(chat_id, bot.id)
-            status = chat_member.status
-            await bot.session.close()
-
-            # Проверяем, имеет ли бот право на отправку сообщений
-            if status in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.CREATOR]:
-                return True
-            else:
-                return False
-        except aiogram.exceptions.TelegramBadRequest as e:
-            logger.error(f"Not found chat {chat_id}")
-            return False
-
-        # except Exception as e:
-        #     logger.error(f"Error check channel {chat_id}: {e}")
-        #     raise HTTPException(status_code=500, detail=f"Error check permissions {chat_id}")
+        # Явная проверка из формы канала всегда идёт в Telegram
+        bot_ids = channel_bot_ids([chat_id], bot_id)
+        return await permission_checker.check(
+            chat_id, force=True, bot_id=bot_ids.get(chat_id)
+        )
+
+
+@router.post("/check")
+async def check_many(
+    data: CheckChannels,
+    force: bool = False,
+    bot_id: str | None = None,
+    authorized: bool = Depends(authenticate_user),
+) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /check")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if len(data.chat_ids) > cfg.permission_check_batch_max:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many chat_ids, max {cfg.permission_check_batch_max}",
+        )
+
+    # null - проверить не удалось (сеть, лимиты Telegram)
+    bot_ids = channel_bot_ids(data.chat_ids, bot_id)
+    return await permission_checker.check_many(
+        data.chat_ids, force=force, bot_ids=bot_ids
+    )
+
+
+@router.get("/files/{id}/{subdir}")
+async def list_files(
+    id: int,
+    subdir: Literal["source", "except", "done"],
+    sort: Literal["name", "number", "mtime"] = "name",
+    order: Literal["asc", "desc"] = "asc",
+    groups: bool = False,
+    cursor: str | None = None,
+    limit: int = 100,
+    authorized: bool = Depends(authenticate_user),
+) -> FilePage:
+    if not authorized:
+        logger.warning(f"Unauthorized access attempt for /files/{id}/{subdir}")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if not 1 <= limit <= cfg.files_page_max:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be in 1..{cfg.files_page_max}"
+        )
+
+    channel: ChannelORM = ChannelRepository.get(id)
+    if not channel:
+        logger.warning(f"Channel with ID {id} not found")
+        raise HTTPException(status_code=404, detail="Channel not found")
+
+    filemanager = ChannelsFileManager(base_dir=cfg.base_dir)
+    try:
+        # Большой каталог читается долго, не держим цикл событий
+        items, next_cursor = await asyncio.to_thread(
+            filemanager.list_files,
+            channel.name,
+            subdir,
+            sort,
+            order,
+            cursor,
+            limit,
+            groups,
+        )
+    except (ChannelNotFound, ChannelBroken) as e:
+        logger.warning(f"Can't list files of channel {channel.name}: {e}")
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return FilePage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/archive/{id}/{number}")
+async def get_archived_post(
+    id: int, number: str, authorized: bool = Depends(authenticate_user)
+):
+    if not authorized:
+        logger.warning(f"Unauthorized access attempt for /archive/{id}/{number}")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    channel: ChannelORM = ChannelRepository.get(id)
+    if not channel:
+        logger.warning(f"Channel with ID {id} not found")
+        raise HTTPException(status_code=404, detail="Channel not found")
+
+    archiver = DoneArchiver(base_dir=cfg.base_dir)
+    if archiver.find_post(channel.name, number) is None:
+        logger.warning(f"Post {number} not found in archive of channel {channel.name}")
+        raise HTTPException(status_code=404, detail="Post not found in archive")
+
+    return StreamingResponse(
+        archiver.iter_post(channel.name, number),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{number}.tar.gz"'},
+    )
+
+
+@router.get("/dead_letters")
+async def get_dead_letters(
+    channel_id: int | None = None,
+    limit: int = 100,
+    authorized: bool = Depends(authenticate_user),
+) -> list[DeadLetter]:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /dead_letters")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    letters = DeadLetterRepository.get_filtered(channel_id=channel_id, limit=limit)
+    return [DeadLetter.model_validate(x) for x in letters]
+
+
+@router.post("/dead_letters/requeue")
+async def requeue_dead_letters(
+    data: RequeueDeadLetters, authorized: bool = Depends(authenticate_user)
+) -> dict:
+    if not authorized:
+        logger.warning("Unauthorized access attempt for /dead_letters/requeue")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if data.ids is None and data.channel_id is None:
+        raise HTTPException(status_code=400, detail="ids or channel_id required")
+
+    letters = DeadLetterRepository.get_filtered(
+        channel_id=data.channel_id, ids=data.ids
+    )
+    filemanager = ChannelsFileManager(base_dir=cfg.base_dir)
+    # Файлы возвращаются в source и уйдут со следующими тиками канала
+    requeued = []
+    failed = []
+    for letter in letters:
+        not_moved = filemanager.move_files(
+            letter.channel_name, letter.files.split("\n"), "except", "source"
+        )
+        # Письмо с неперенесёнными файлами остаётся, его можно повторить
+        if not_moved:
+            failed.append(letter.id)
+        else:
+            requeued.append(letter)
+    DeadLetterRepository.delete_many([letter.id for letter in requeued])
+
+    # Каналы, выключенные из-за пустого source, снова ставятся в расписание
+    for channel_id in {letter.channel_id for letter in requeued}:
+        channel: ChannelORM = ChannelRepository.get(channel_id)
+        if channel is None or channel.active:
+            continue
+        channel.active = True
+        ChannelRepository.update(channel)
+        if cfg.posting_mode == "api":
+            await add_posting_task(channel)
+    logger.info(f"Requeued {len(requeued)} dead letters, {len(failed)} failed")
+
+    return {"status": "ok", "requeued": len(requeued), "failed": failed}
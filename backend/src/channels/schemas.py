@@ -1,6 +1,8 @@
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+
+from heap_scheduler import CronWindow
 
 
 class NewChannel(BaseModel):
@@ -8,6 +10,19 @@ class NewChannel(BaseModel):
     chat_id: Optional[int] = Field(None, example=123456789)
     parse_mode: Optional[str] = Field(None, example="Markdown")
     interval: Optional[int] = Field(None, example=60)
+    posting_window: Optional[str] = Field(None, example="* 9-21 * * *")
+    duplicate_policy: Optional[Literal["allow", "skip", "reuse"]] = Field(
+        "allow", example="skip"
+    )
+    # Бот пула, который постит в канал; пусто - назначится при запуске
+    bot_id: Optional[str] = Field(None, example="123456789")
+
+    @field_validator("posting_window")
+    @classmethod
+    def validate_posting_window(cls, value: Optional[str]) -> Optional[str]:
+        if value:
+            CronWindow(value)
+        return value or None
 
     class Config:
         schema_extra = {
@@ -16,6 +31,8 @@ class NewChannel(BaseModel):
                 "chat_id": 123456789,
                 "parse_mode": "Markdown",
                 "interval": 60,
+                "posting_window": "* 9-21 * * *",
+                "duplicate_policy": "skip",
             }
         }
 
@@ -29,6 +46,7 @@ class Channel(NewChannel):
     active: bool = Field(..., example=False)
 
     class Config:
+        from_attributes = True
         schema_extra = {
             "example": {
                 "id": 1,
@@ -75,3 +93,54 @@ class Channels(BaseModel):
                 ]
             }
         }
+
+
+class CheckChannels(BaseModel):
+    chat_ids: List[int] = Field(..., example=[-1001234567890, -1009876543210])
+
+
+class DeadLetter(BaseModel):
+    id: int = Field(..., example=1)
+    channel_id: int = Field(..., example=1)
+    channel_name: str = Field(..., example="TechUpdatesChannel")
+    number: str = Field(..., example="0001")
+    files: List[str] = Field(..., example=["0001.txt", "0001_1.jpg"])
+    error_class: str = Field(..., example="transient")
+    error: str = Field(..., example="Request timeout error")
+    attempts: int = Field(..., example=5)
+    created_at: float = Field(..., example=1735689600.0)
+
+    class Config:
+        from_attributes = True
+
+    @field_validator("files", mode="before")
+    @classmethod
+    def split_files(cls, value):
+        if isinstance(value, str):
+            return value.split("\n")
+        return value
+
+
+class RequeueDeadLetters(BaseModel):
+    ids: Optional[List[int]] = Field(None, example=[1, 2, 3])
+    channel_id: Optional[int] = Field(None, example=1)
+
+
+class FileEntry(BaseModel):
+    name: str = Field(..., example="0001_1.jpg")
+    number: str = Field(..., example="0001")
+    size: int = Field(..., example=524288)
+    mtime: float = Field(..., example=1735689600.0)
+
+
+class FileGroup(BaseModel):
+    number: str = Field(..., example="0001")
+    files: int = Field(..., example=3)
+    size: int = Field(..., example=1572864)
+    mtime: float = Field(..., example=1735689600.0)
+
+
+class FilePage(BaseModel):
+    items: List[Union[FileEntry, FileGroup]]
+    # null - это последняя страница
+    next_cursor: Optional[str] = Field(None, example="WyJzb3VyY2UiLCJuYW1lIl0")
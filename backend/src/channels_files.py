@@ -1,4 +1,10 @@
+import base64
+import bisect
+import heapq
+import json
 import os
+import shutil
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
 
 from loguru import logger
 
@@ -15,8 +21,79 @@ class ChannelBroken(Exception):
     pass
 
 
+class InvalidCursor(ValueError):
+    pass
+
+
+LISTING_SORTS = ("name", "number", "mtime")
+# Типы элементов ключа курсора: (сортировка, группы) -> типы
+CURSOR_KEYS = {
+    ("name", False): (str,),
+    ("number", False): (int, int, str, str),
+    ("mtime", False): (int, str),
+    ("name", True): (str,),
+    ("number", True): (int, int, str),
+}
+
+
+def file_number(file_name: str) -> str:
+    """Номер группы по имени файла (0001_1.jpg -> 0001)"""
+    return file_name.split(".")[0].split("_")[0]
+
+
+def number_key(number: str) -> list:
+    # Номера сравниваем как числа (9 раньше 10), нечисловые - в конце
+    return [0, int(number), number] if number.isdigit() else [1, 0, number]
+
+
+class _Desc:
+    """Обёртка ключа сортировки для обратного порядка в heapq и bisect"""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other: "_Desc") -> bool:
+        return other.key < self.key
+
+    def __eq__(self, other: "_Desc") -> bool:
+        return self.key == other.key
+
+
+def encode_cursor(query: list, key: list) -> str:
+    data = json.dumps({"q": query, "k": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, query: list) -> list:
+    """Ключ последнего элемента страницы; курсор другого запроса не принимаем"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        query_, key = data["q"], data["k"]
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if query_ != query or not isinstance(key, list):
+        raise InvalidCursor("Cursor belongs to a different listing")
+    # Ключ не той формы сломал бы сравнение с ключами файлов
+    types = CURSOR_KEYS.get((query[1], query[3]), ())
+    if len(key) != len(types) or any(type(v) is not t for v, t in zip(key, types)):
+        raise InvalidCursor("Malformed cursor key")
+    return key
+
+
+def _stat(entry: os.DirEntry) -> Optional[os.stat_result]:
+    """stat записи каталога; None - файл удалили, пока шёл проход"""
+    try:
+        return entry.stat()
+    except FileNotFoundError:
+        return None
+
+
 class ChannelsFileManager:
     _instance = None
+    subdirs = ("source", "except", "done")
 
     def __init__(self, base_dir="/"):
         self.base_dir = base_dir
@@ -31,7 +108,8 @@ class ChannelsFileManager:
             for channel in channels:
                 if os.path.isdir(os.path.join(self.base_dir, channel)):
                     data["channels"].append(self.get_channel_by_name(channel))
-            logger.info(f"Retrieved channels: {data}")
+            # Полные списки файлов в лог не пишем: это мегабайты на больших каналах
+            logger.info(f"Retrieved {len(data['channels'])} channels")
             return data
         except Exception as e:
             logger.error(f"Failed to retrieve channels: {e}")
@@ -56,6 +134,8 @@ class ChannelsFileManager:
                         raise ChannelBroken(f"Directory {dir_path} not found")
                 logger.info(f"Retrieved data for channel: {name}")
                 return data
+            except ChannelBroken:
+                raise
             except FileNotFoundError as e:
                 logger.error(f"Channel {name} not found: {e}")
                 raise ChannelNotFound(f"Channel {name} not found")
@@ -65,6 +145,181 @@ class ChannelsFileManager:
         else:
             raise ChannelNotFound(f"Channel {name} not found")
 
+    def check_layout(self, name: str) -> List[str]:
+        """Возвращает недостающие подкаталоги канала без чтения их содержимого"""
+        channel_path = os.path.join(self.base_dir, name)
+        if not os.path.isdir(channel_path):
+            raise ChannelNotFound(f"Channel {name} not found")
+        return [
+            subdir
+            for subdir in self.subdirs
+            if not os.path.isdir(os.path.join(channel_path, subdir))
+        ]
+
+    def iter_files(self, name: str, subdir: str) -> Iterator[os.DirEntry]:
+        """Файлы подкаталога канала по одному, без списка всего каталога"""
+        if not os.path.isdir(os.path.join(self.base_dir, name)):
+            raise ChannelNotFound(f"Channel {name} not found")
+        dir_path = os.path.join(self.base_dir, name, subdir)
+        if not os.path.isdir(dir_path):
+            raise ChannelBroken(f"Directory {dir_path} not found")
+
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    yield entry
+
+    def list_files(
+        self,
+        name: str,
+        subdir: str,
+        sort: str = "name",
+        order: str = "asc",
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        groups: bool = False,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Страница файлов (или групп) подкаталога и курсор следующей.
+
+        Курсор - ключ сортировки последнего элемента, поэтому добавление и
+        удаление файлов не сдвигает следующие страницы. За один проход по
+        каталогу держим только limit + 1 лучших кандидатов, память не
+        зависит от числа файлов.
+        """
+        if subdir not in self.subdirs:
+            raise ValueError(f"Unknown directory {subdir}")
+        if sort not in LISTING_SORTS or order not in ("asc", "desc"):
+            raise ValueError(f"Unknown sort {sort} {order}")
+        if groups and sort == "mtime":
+            # mtime группы растёт по ходу прохода, ключ страницы не стабилен
+            raise ValueError("Groups can't be sorted by mtime")
+
+        query = [subdir, sort, order, groups]
+        after = decode_cursor(cursor, query) if cursor else None
+        wrap = _Desc if order == "desc" else (lambda key: key)
+        if groups:
+            return self._list_groups(name, subdir, sort, wrap, after, limit, query)
+
+        def file_key(entry: os.DirEntry) -> list:
+            if sort == "number":
+                return number_key(file_number(entry.name)) + [entry.name]
+            if sort == "mtime":
+                return [entry.stat().st_mtime_ns, entry.name]
+            return [entry.name]
+
+        candidates = self.iter_files(name, subdir)
+        if sort == "mtime":
+            # DirEntry кэширует stat, повторно файл не читается
+            candidates = (e for e in candidates if _stat(e) is not None)
+        if after is not None:
+            candidates = (e for e in candidates if wrap(after) < wrap(file_key(e)))
+        page = heapq.nsmallest(
+            limit + 1, candidates, key=lambda entry: wrap(file_key(entry))
+        )
+
+        items = []
+        for entry in page[:limit]:
+            # stat только для файлов страницы (для name и number)
+            stat = _stat(entry)
+            if stat is None:
+                continue
+            items.append(
+                {
+                    "name": entry.name,
+                    "number": file_number(entry.name),
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                }
+            )
+        next_cursor = None
+        if len(page) > limit:
+            next_cursor = encode_cursor(query, file_key(page[limit - 1]))
+        return items, next_cursor
+
+    def _list_groups(
+        self, name: str, subdir: str, sort: str, wrap, after, limit: int, query: list
+    ) -> Tuple[List[dict], Optional[str]]:
+        def group_key(number: str) -> list:
+            return number_key(number) if sort == "number" else [number]
+
+        # Отсортированные кандидаты (ключ, номер) и их агрегаты. Вытесняется
+        # всегда наибольший ключ, поэтому граница только убывает и файлы
+        # вытесненной группы дальше не пройдут проверку
+        selected: List[tuple] = []
+        aggregates: Dict[str, dict] = {}
+        for entry in self.iter_files(name, subdir):
+            stat = _stat(entry)
+            if stat is None:
+                continue
+            number = file_number(entry.name)
+            group = aggregates.get(number)
+            if group is None:
+                key = wrap(group_key(number))
+                if after is not None and not wrap(after) < key:
+                    continue
+                if len(selected) > limit:
+                    if not key < selected[-1][0]:
+                        continue
+                    del aggregates[selected.pop()[1]]
+                bisect.insort(selected, (key, number))
+                group = aggregates[number] = {
+                    "number": number,
+                    "files": 0,
+                    "size": 0,
+                    "mtime": 0.0,
+                }
+
+            group["files"] += 1
+            group["size"] += stat.st_size
+            group["mtime"] = max(group["mtime"], stat.st_mtime)
+
+        items = [aggregates[number] for _, number in selected[:limit]]
+        next_cursor = None
+        if len(selected) > limit:
+            next_cursor = encode_cursor(query, group_key(selected[limit - 1][1]))
+        return items, next_cursor
+
+    def file_path(self, channel_name: str, subdir: str, file: str) -> str:
+        return os.path.join(self.base_dir, channel_name, subdir, file)
+
+    def file_size(self, channel_name: str, subdir: str, file: str) -> int:
+        return os.path.getsize(self.file_path(channel_name, subdir, file))
+
+    def file_stat(self, channel_name: str, subdir: str, file: str) -> os.stat_result:
+        return os.stat(self.file_path(channel_name, subdir, file))
+
+    def open_file(self, channel_name: str, subdir: str, file: str) -> BinaryIO:
+        return open(self.file_path(channel_name, subdir, file), "rb")
+
+    def read_text(self, channel_name: str, subdir: str, file: str) -> str:
+        with open(self.file_path(channel_name, subdir, file), "r") as f:
+            return f.read()
+
+    def move_files(
+        self, channel_name: str, files: list, src: str, dst: str
+    ) -> List[str]:
+        """Перемещает файлы канала между подкаталогами (source -> done и т.п.).
+
+        Возвращает файлы, которые переместить не удалось.
+        """
+        logger.info(f"Moving files to '{dst}' for channel {channel_name}")
+
+        failed = []
+        for file in files:
+            source_path = self.file_path(channel_name, src, file)
+            target_path = self.file_path(channel_name, dst, file)
+
+            try:
+                shutil.move(source_path, target_path)
+                if dst == "done":
+                    # mtime в done - время публикации, по нему работает архивация
+                    os.utime(target_path)
+                logger.info(f"File {file} moved to '{dst}' for channel {channel_name}")
+            except Exception as e:
+                logger.error(f"Failed to move file {file} to '{dst}': {e}")
+                failed.append(file)
+        return failed
+
     def create_channel(self, channel_name: str):
         """Создает структуру канала с подкаталогами 'source', 'except' и 'done'."""
         try:
@@ -101,7 +356,7 @@ class ChannelsFileManager:
                 raise ChannelNotFound(f"Channel {channel_name} does not exist.")
 
             # Удаляем подкаталоги канала
-            for subdir in ["source", "except", "done"]:
+            for subdir in ["source", "except", "done", "archive", "temp"]:
                 subdir_path = os.path.join(channel_path, subdir)
                 if os.path.exists(subdir_path):
                     files = os.listdir(subdir_path)
@@ -122,8 +377,8 @@ class ChannelsFileManager:
                 f"An error occurred while deleting channel {channel_name}: {e}"
             )
 
-    def fix_channel(self, channel_name: str, missing_dir: str):
-        """Восстанавливает недостающий подкаталог для канала."""
+    def fix_channel(self, channel_name: str, missing_dir: Optional[str] = None):
+        """Восстанавливает недостающий подкаталог канала (по умолчанию - все)."""
         try:
             channel_path = os.path.join(self.base_dir, channel_name)
             if not os.path.exists(channel_path):
@@ -132,10 +387,12 @@ class ChannelsFileManager:
                 )
                 raise ChannelNotFound(f"Channel {channel_name} does not exist.")
 
-            # Восстанавливаем недостающий подкаталог
-            missing_dir_path = os.path.join(channel_path, missing_dir)
-            os.makedirs(missing_dir_path)
-            logger.info(f"Created missing directory: {missing_dir_path}")
+            # Восстанавливаем недостающие подкаталоги
+            for subdir in [missing_dir] if missing_dir else self.subdirs:
+                missing_dir_path = os.path.join(channel_path, subdir)
+                if not os.path.isdir(missing_dir_path):
+                    os.makedirs(missing_dir_path, exist_ok=True)
+                    logger.info(f"Created missing directory: {missing_dir_path}")
 
         except ChannelNotFound as e:
             logger.error(f"Failed to fix channel {channel_name}: {e}")
@@ -0,0 +1,118 @@
+import asyncio
+import gzip
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from settings import Settings, get_settings
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, без него отдаём gzip
+    brotli = None
+
+cfg: Settings = get_settings()
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+# Большие ответы сжимаются в потоке, чтобы не задерживать цикл событий
+THREAD_THRESHOLD = 256 * 1024
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Лучшая кодировка из Accept-Encoding с учётом q (br при равенстве)"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip().lower()] = q
+
+    available = ("br", "gzip") if brotli is not None else ("gzip",)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(coding: str, body: bytes) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=cfg.compression_brotli_quality)
+    return gzip.compress(body, compresslevel=cfg.compression_gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    """ASGI-мидлварь сжатия ответов gzip/brotli по Accept-Encoding.
+
+    Сжимаются только ответы с Content-Length от compression_min_size:
+    потоковые ответы (архивы постов) отдаются как есть.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+        chunks = []
+
+        async def compressing_send(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                length = headers.get("content-length")
+                passthrough = (
+                    length is None
+                    or int(length) < cfg.compression_min_size
+                    or "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(
+                        COMPRESSIBLE_TYPES
+                    )
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            if len(body) > THREAD_THRESHOLD:
+                compressed = await asyncio.to_thread(compress, coding, body)
+            else:
+                compressed = compress(coding, body)
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(compressed) < len(body):
+                body = compressed
+                headers["Content-Encoding"] = coding
+                headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, compressing_send)
@@ -1,5 +1,5 @@
 from loguru import logger
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 
 from models import Base
@@ -7,16 +7,37 @@ from settings import get_settings
 
 cfg = get_settings()
 
-engine = create_engine(f"sqlite:///../database/db.db", echo=cfg.debug)
+engine = create_engine(cfg.database_url, echo=cfg.debug)
 
 session_factory = sessionmaker(engine)
 
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
     logger.info("Tables created")
 
 
+def add_missing_columns():
+    """Добавляет в существующие таблицы колонки, появившиеся в моделях"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    )
+                )
+                logger.warning(f"Added column {table.name}.{column.name}")
+
+
 def drop_tables():
     Base.metadata.create_all(bind=engine)
     logger.warning("Tables dropped")
@@ -0,0 +1,83 @@
+import hashlib
+import re
+from typing import BinaryIO, Dict, List, Optional
+
+from loguru import logger
+
+from channels_files import ChannelsFileManager
+from models import ChannelORM
+from publishing import media_type
+
+DUPLICATE_POLICIES = ("allow", "skip", "reuse")
+
+
+def file_sha256(f: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    """Хеш содержимого файла, читаем кусками без загрузки в память"""
+    digest = hashlib.sha256()
+    while chunk := f.read(chunk_size):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    """Хеш текста без учёта регистра и пробелов"""
+    normalized = re.sub(r"\s+", " ", text).strip().lower()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def image_dhash(f: BinaryIO) -> Optional[str]:
+    """Перцептивный difference hash (64 бита): совпадает у пересжатых копий"""
+    from PIL import Image
+
+    try:
+        with Image.open(f) as img:
+            img.draft("L", (64, 64))
+            pixels = list(img.convert("L").resize((9, 8)).getdata())
+    except Exception as e:
+        logger.warning(f"Failed to compute perceptual hash: {e}")
+        return None
+
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def fingerprint_files(
+    channel: ChannelORM,
+    files: List[str],
+    text: Optional[str],
+    filemanager: ChannelsFileManager,
+) -> Dict[str, dict]:
+    """Отпечатки файлов поста: имя файла -> {sha256, dhash, kind}"""
+    fingerprints = {}
+    for file in files:
+        if file.endswith(".txt"):
+            if text is not None:
+                fingerprints[file] = {"sha256": text_hash(text), "kind": "text"}
+            continue
+
+        kind = media_type(file)
+        if kind is None:
+            continue
+        # Читаем через filemanager: в симуляции файлы живут в памяти
+        with filemanager.open_file(channel.name, "source", file) as f:
+            sha256 = file_sha256(f)
+            f.seek(0)
+            dhash = image_dhash(f) if kind == "photo" else None
+        fingerprints[file] = {"sha256": sha256, "dhash": dhash, "kind": kind}
+    return fingerprints
+
+
+def extract_file_id(message) -> Optional[str]:
+    """file_id загруженного файла из ответа Telegram"""
+    if getattr(message, "photo", None):
+        return message.photo[-1].file_id
+    for attr in ("video", "animation", "document"):
+        media = getattr(message, attr, None)
+        if media is not None:
+            return media.file_id
+    return None
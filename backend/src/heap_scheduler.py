@@ -0,0 +1,294 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from loguru import logger
+
+
+def next_run_after(due: float, interval: float, now: float) -> float:
+    """Следующий запуск от прошлого срока, а не от момента срабатывания.
+
+    Так задержка цикла не копится от тика к тику; пропущенные запуски
+    (например, после остановки процесса) не догоняются пачкой.
+    """
+    if interval <= 0:
+        return now
+    next_run = due + interval
+    if next_run <= now:
+        next_run += ((now - next_run) // interval + 1) * interval
+    return next_run
+
+
+class CronWindow:
+    """Окно постинга в формате cron: "минута час день месяц день_недели".
+
+    Поддерживаются *, */n, a-b, a-b/n и списки через запятую.
+    Дни недели как в cron: 0 (или 7) - воскресенье.
+    """
+
+    BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Posting window must have 5 fields: {expression!r}")
+
+        self.expression = expression
+        parsed = [
+            self._parse_field(field, low, high)
+            for field, (low, high) in zip(fields, self.BOUNDS)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_str = part.split("/", 1)
+                step = int(step_str)
+                if step < 1:
+                    raise ValueError(f"Invalid step in {field!r}")
+
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = end = int(part)
+
+            if start < low or end > high or start > end:
+                raise ValueError(f"Value out of range {low}-{high} in {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        # Как в cron: если заданы и день месяца, и день недели - достаточно одного
+        if not self.any_day and not self.any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def contains(self, timestamp: float) -> bool:
+        dt = datetime.fromtimestamp(timestamp)
+        return (
+            dt.month in self.months
+            and self._day_matches(dt)
+            and dt.hour in self.hours
+            and dt.minute in self.minutes
+        )
+
+    def next_fire(self, timestamp: float) -> float:
+        """Ближайший момент не раньше timestamp, попадающий в окно"""
+        if self.contains(timestamp):
+            return timestamp
+
+        dt = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0)
+        dt += timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(
+                    day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f"Posting window {self.expression!r} never fires")
+
+
+class HeapJob:
+    def __init__(
+        self,
+        id: str,
+        func: Callable,
+        interval: float,
+        args: Sequence[Any],
+        name: str,
+        window: Optional[CronWindow],
+    ):
+        self.id = id
+        self.func = func
+        self.interval = interval
+        self.args = args
+        self.name = name
+        self.window = window
+        self.next_run_time: float = 0.0
+        self.seq = 0
+        self.running = False
+
+
+class HeapScheduler:
+    """Планировщик на одном таймере для очень большого числа каналов.
+
+    Все задачи лежат в min-heap (next_run, seq, job_id) и обслуживаются одной
+    корутиной. Добавление и перенос - O(log n), удаление - O(1) с ленивым
+    выбрасыванием устаревших записей из кучи.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._heap: List[Tuple[float, int, str]] = []
+        self._jobs: Dict[str, HeapJob] = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.running = False
+
+    def add_job(
+        self,
+        func: Callable,
+        interval: float,
+        id: str,
+        args: Sequence[Any] = (),
+        name: Optional[str] = None,
+        window: Optional[str] = None,
+        next_run_time: Optional[float] = None,
+    ) -> HeapJob:
+        job = HeapJob(
+            id=id,
+            func=func,
+            interval=interval,
+            args=args,
+            name=name or id,
+            window=CronWindow(window) if window else None,
+        )
+        if next_run_time is None:
+            next_run_time = self.clock() + interval
+        with self._lock:
+            self._jobs[id] = job
+            self._push(job, next_run_time)
+        self._wake()
+        return job
+
+    def reschedule_job(self, id: str, next_run_time: float):
+        with self._lock:
+            self._push(self._jobs[id], next_run_time)
+        self._wake()
+
+    def remove_job(self, id: str):
+        with self._lock:
+            del self._jobs[id]
+            # Запись в куче станет устаревшей; чистим, если их накопилось много
+            if len(self._heap) > 2 * len(self._jobs) + 1024:
+                self._compact()
+
+    def get_job(self, id: str) -> Optional[HeapJob]:
+        return self._jobs.get(id)
+
+    def get_jobs(self) -> List[HeapJob]:
+        return list(self._jobs.values())
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.running = True
+        self._task = self._loop.create_task(self._run())
+        logger.info("Heap scheduler started")
+
+    def shutdown(self):
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+        logger.info("Heap scheduler stopped")
+
+    def next_run(self) -> Optional[float]:
+        """Время ближайшего запуска (None, если задач нет)"""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def run_due(self, now: Optional[float] = None) -> List[asyncio.Task]:
+        """Запускает все задачи, срок которых наступил, и ставит их следующий запуск"""
+        now = self.clock() if now is None else now
+        tasks = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, job_id = heapq.heappop(self._heap)
+                job = self._jobs.get(job_id)
+                if job is None or job.seq != seq:
+                    continue
+
+                self._push(job, next_run_after(due, job.interval, now))
+                if job.running:
+                    logger.warning(
+                        f"Job {job.name} is still running, skipping this run"
+                    )
+                    continue
+                tasks.append(job)
+
+        return [asyncio.ensure_future(self._execute(job)) for job in tasks]
+
+    async def _execute(self, job: HeapJob):
+        job.running = True
+        try:
+            await job.func(*job.args)
+        except Exception as e:
+            logger.error(f"Job {job.name} raised: {e}")
+        finally:
+            job.running = False
+
+    async def _run(self):
+        while self.running:
+            self._wakeup.clear()
+            next_run = self.next_run()
+            if next_run is None:
+                await self._wakeup.wait()
+                continue
+
+            delay = next_run - self.clock()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.run_due()
+
+    def _push(self, job: HeapJob, next_run_time: float):
+        if job.window is not None:
+            next_run_time = job.window.next_fire(next_run_time)
+        job.seq = next(self._counter)
+        job.next_run_time = next_run_time
+        heapq.heappush(self._heap, (next_run_time, job.seq, job.id))
+
+    def _drop_stale(self):
+        while self._heap:
+            _, seq, job_id = self._heap[0]
+            job = self._jobs.get(job_id)
+            if job is not None and job.seq == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        self._heap = [
+            (job.next_run_time, job.seq, job.id) for job in self._jobs.values()
+        ]
+        heapq.heapify(self._heap)
+
+    def _wake(self):
+        if self._loop is None or self._wakeup is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Цикл событий уже закрыт
+            pass
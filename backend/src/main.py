@@ -1,15 +1,21 @@
+import asyncio
 from contextlib import asynccontextmanager
 
-import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from loguru import logger
 
+from admin.router import router as admin_router
 from channels.router import router as channels_router
 from channels_files import ChannelsFileManager
+from compression import CompressionMiddleware
 from database import create_tables, drop_tables
-from scheduler import add_tasks, scheduler
+from permissions import permission_checker
+from profiler import ProfilingMiddleware
+from scheduler import add_tasks, start_scheduler, stop_scheduler
 from settings import Settings, get_settings
+from startup import startup_timer, warm_imports
 
 cfg: Settings = get_settings()
 
@@ -18,16 +24,26 @@ logger.add(cfg.logs_path + "/" + "loguru.log", rotation="5 hours", retention=3)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_tables()
+    with startup_timer.step("create_tables"):
+        create_tables()
     logger.success("Tables created")
-    scheduler.start()
-    await add_tasks()
-    logger.success("Scheduler started...")
+    # В режиме workers постингом занимается worker.py
+    if cfg.posting_mode == "api":
+        with startup_timer.step("start_scheduler"):
+            start_scheduler()
+        with startup_timer.step("add_tasks"):
+            await add_tasks()
+        logger.success("Scheduler started...")
+    startup_timer.ready()
+    # Ссылка держит задачу живой до конца работы приложения
+    app.state.warm_imports = asyncio.create_task(warm_imports())
 
     yield
 
-    scheduler.shutdown()
-    logger.success("Scheduler stopped")
+    if cfg.posting_mode == "api":
+        await stop_scheduler()
+        logger.success("Scheduler stopped")
+    await permission_checker.close()
     if cfg.debug:
         drop_tables()
         filemanager = ChannelsFileManager(cfg.base_dir)
@@ -35,7 +51,7 @@ async def lifespan(app: FastAPI):
         logger.critical("Tables dropped")
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -44,10 +60,13 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 logger.success("Application created")
 
 app.include_router(channels_router)
+app.include_router(admin_router)
 
 
 @app.get("/ping")
@@ -58,4 +77,6 @@ async def ping():
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app)
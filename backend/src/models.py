@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Float, Integer, String, Text
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -24,7 +24,56 @@ class ChannelORM(Base):
     parse_mode = Column(String, default="html")
 
     active = Column(Boolean, default=False, nullable=False)
+    # cron-выражение "минута час день месяц день_недели", None - без ограничений
+    posting_window = Column(String, nullable=True)
+    # Дубликаты уже опубликованного: allow, skip или reuse (повтор по file_id)
+    duplicate_policy = Column(String, default="allow", nullable=True)
+    # id бота пула (число из токена); None - назначается наименее загруженный
+    bot_id = Column(String, nullable=True)
 
     path_to_source_dir = Column(String, nullable=False, unique=True)
     path_to_done_dir = Column(String, nullable=False, unique=True)
     path_to_except_dir = Column(String, nullable=True, unique=True)
+
+
+class LeaseORM(Base):
+    __tablename__ = "leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(Float, nullable=False)
+
+
+class DeadLetterORM(Base):
+    """Пост, который не удалось опубликовать после всех повторов"""
+
+    __tablename__ = "dead_letters"
+
+    id = Column(Integer, primary_key=True)
+    channel_id = Column(Integer, nullable=False, index=True)
+    channel_name = Column(String, nullable=False)
+    number = Column(String, nullable=False)
+    # Файлы группы через "\n", лежат в except канала
+    files = Column(Text, nullable=False)
+    error_class = Column(String, nullable=False)
+    error = Column(Text, nullable=False)
+    attempts = Column(Integer, default=1, nullable=False)
+    created_at = Column(Float, nullable=False)
+
+
+class FingerprintORM(Base):
+    """Отпечаток опубликованного файла или текста для поиска дубликатов"""
+
+    __tablename__ = "fingerprints"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), nullable=False, index=True)
+    # difference hash изображения, None для остальных типов
+    dhash = Column(String(16), nullable=True, index=True)
+    kind = Column(String, nullable=False)
+    channel_id = Column(Integer, nullable=False)
+    file = Column(String, nullable=False)
+    file_id = Column(String, nullable=True)
+    # file_id действует только для загрузившего файл бота
+    bot_id = Column(String, nullable=True)
+    published_at = Column(Float, nullable=False)
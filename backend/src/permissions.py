@@ -0,0 +1,107 @@
+import asyncio
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from loguru import logger
+
+from bot_pool import BotPool, primary_bot_id
+from settings import Settings, get_settings
+from startup import warm_imports
+
+cfg: Settings = get_settings()
+
+
+class PermissionChecker:
+    """Проверка прав ботов на постинг в каналах с кэшем на permission_cache_ttl.
+
+    Права проверяются у бота, назначенного каналу: у каждого бота пула
+    одна сессия и свой лимит permission_check_rate в секунду, всего
+    одновременно не больше permission_check_concurrency запросов.
+    """
+
+    def __init__(self):
+        self.cache: Dict[Tuple[str, int], Tuple[bool, float]] = {}
+        self.bots = BotPool(cfg.permission_check_rate)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def cached(self, chat_id: int, bot_id: Optional[str] = None) -> Optional[bool]:
+        """Результат из кэша или None, если проверки не было или она устарела"""
+        entry = self.cache.get((bot_id or primary_bot_id(), chat_id))
+        if entry is None or time.time() - entry[1] > cfg.permission_cache_ttl:
+            return None
+        return entry[0]
+
+    def invalidate(self, chat_id: int, bot_id: Optional[str] = None):
+        self.cache.pop((bot_id or primary_bot_id(), chat_id), None)
+
+    async def check(
+        self, chat_id: int, force: bool = False, bot_id: Optional[str] = None
+    ) -> bool:
+        """Может ли бот публиковать в чат; ошибки сети пробрасываются"""
+        bot_id = bot_id or primary_bot_id()
+        if not force:
+            allowed = self.cached(chat_id, bot_id)
+            if allowed is not None:
+                return allowed
+
+        allowed = await self._fetch(chat_id, bot_id)
+        self.cache[(bot_id, chat_id)] = (allowed, time.time())
+        return allowed
+
+    async def check_many(
+        self,
+        chat_ids: Iterable[int],
+        force: bool = False,
+        bot_ids: Optional[Dict[int, str]] = None,
+    ) -> Dict[int, Optional[bool]]:
+        """Пакетная проверка; None - проверить не удалось, кэш не трогаем"""
+        chat_ids = list(dict.fromkeys(chat_ids))
+        bot_ids = bot_ids or {}
+
+        async def safe_check(chat_id: int) -> Optional[bool]:
+            try:
+                return await self.check(chat_id, force, bot_ids.get(chat_id))
+            except Exception as e:
+                logger.error(f"Error check permissions {chat_id}: {e}")
+                return None
+
+        results = await asyncio.gather(*(safe_check(chat_id) for chat_id in chat_ids))
+        return dict(zip(chat_ids, results))
+
+    async def close(self):
+        await self.bots.close()
+        # Семафор привязан к циклу событий
+        self._semaphore = None
+
+    async def _fetch(self, chat_id: int, bot_id: str) -> bool:
+        # aiogram импортируется при первой проверке, а не при старте API,
+        # и не в цикле событий
+        await warm_imports()
+        import aiogram.exceptions
+        from aiogram.enums import ChatMemberStatus
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(cfg.permission_check_concurrency)
+
+        async with self._semaphore:
+            await self.bots.limiter(bot_id).acquire()
+            bot = self.bots.get(bot_id)
+            try:
+                # Получаем информацию о члене чата (в данном случае о боте)
+                chat_member = await bot.get_chat_member(chat_id, bot.id)
+            except (
+                aiogram.exceptions.TelegramBadRequest,
+                aiogram.exceptions.TelegramForbiddenError,
+            ) as e:
+                logger.error(f"Not found chat {chat_id}: {e}")
+                return False
+
+        if chat_member.status == ChatMemberStatus.CREATOR:
+            return True
+        if chat_member.status == ChatMemberStatus.ADMINISTRATOR:
+            # В каналах администратору может быть запрещена публикация
+            return getattr(chat_member, "can_post_messages", None) is not False
+        return False
+
+
+permission_checker = PermissionChecker()
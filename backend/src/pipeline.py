@@ -0,0 +1,647 @@
+import asyncio
+import functools
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+
+from bot_pool import BotPool, primary_bot_id, resolve_bot_id
+from channels_files import ChannelsFileManager
+from fingerprint import extract_file_id, fingerprint_files
+from models import ChannelORM, DeadLetterORM
+from prefetch import PrefetchBuffer
+from publishing import (
+    build_media,
+    group_files_by_number,
+    media_sources,
+    media_temp_files,
+    media_type,
+    move_files_to_done,
+    move_files_to_except,
+    prepare_publication_files,
+    prepare_videos,
+    read_caption,
+    remove_temp_files,
+    separate_files_by_type,
+    split_unsupported,
+)
+from repository import DeadLetterRepository, FingerprintRepository
+from retry import RETRYABLE, CircuitBreaker, backoff_delay, classify
+from settings import Settings, get_settings
+from startup import warm_imports
+
+if TYPE_CHECKING:
+    from bot import CustomBot
+
+cfg: Settings = get_settings()
+
+STAGES = ("scan", "prepare", "send", "finalize")
+
+
+class StageStats:
+    """Время обработки элементов стадии (последние `size` замеров)"""
+
+    def __init__(self, size: int = 1000):
+        self.durations = deque(maxlen=size)
+        self.processed = 0
+        self.errors = 0
+
+    def add(self, duration: float):
+        self.durations.append(duration)
+        self.processed += 1
+
+    def summary(self) -> dict:
+        values = sorted(self.durations)
+
+        def percentile(p: float) -> float:
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(len(values) * p))]
+
+        return {
+            "processed": self.processed,
+            "errors": self.errors,
+            "p50_ms": percentile(0.5) * 1000,
+            "p99_ms": percentile(0.99) * 1000,
+        }
+
+
+class PostJob:
+    """Один пост канала, проходящий через стадии конвейера"""
+
+    def __init__(
+        self,
+        channel: ChannelORM,
+        number: str,
+        files: List[str],
+        last: bool,
+        done: Optional[asyncio.Future],
+    ):
+        self.channel = channel
+        self.number = number
+        self.files = files
+        self.last = last
+        self.done = done
+        self.text: Optional[str] = None
+        self.media: list = []
+        self.error: Optional[Exception] = None
+        # Стадия, с которой повторять: отправка или заново подготовка
+        self.failed_stage: Optional[str] = None
+        self.attempts = 0
+        self.replacements: Dict[str, List[str]] = {}
+        self.fingerprints: Dict[str, dict] = {}
+        self.file_ids: Dict[str, str] = {}
+        self.duplicate = False
+        self.messages: Optional[list] = None
+        # Метка сжатых копий: у заранее подготовленного поста свои файлы
+        self.temp_tag = ""
+
+    def use_prepared(self, prepared: "PostJob"):
+        """Берём результат подготовки, сделанной заранее"""
+        self.text = prepared.text
+        self.media = prepared.media
+        self.replacements = prepared.replacements
+        self.fingerprints = prepared.fingerprints
+        self.file_ids = prepared.file_ids
+        self.duplicate = prepared.duplicate
+
+    def temp_files(self) -> List[str]:
+        return media_temp_files(self.media)
+
+
+class PublishPipeline:
+    """Конвейер публикации: scan -> prepare -> send -> finalize.
+
+    Стадии связаны ограниченными очередями и обрабатываются своими пулами
+    корутин, поэтому сжатие картинок одного канала идёт параллельно с
+    отправкой в Telegram другого.
+    """
+
+    def __init__(
+        self,
+        on_drained: Callable[[ChannelORM], None],
+        on_channel_error: Callable[[ChannelORM, Exception], Awaitable[None]],
+        owns_channel: Callable[[ChannelORM], bool] = lambda channel: True,
+    ):
+        self.on_drained = on_drained
+        self.on_channel_error = on_channel_error
+        # Повтор ставится в очередь, только если канал всё ещё наш
+        self.owns_channel = owns_channel
+        self.loop = asyncio.get_running_loop()
+
+        self.queues: Dict[str, asyncio.Queue] = {
+            stage: asyncio.Queue(maxsize=cfg.pipeline_queue_size) for stage in STAGES
+        }
+        self.concurrency = {
+            "scan": cfg.pipeline_scan_workers,
+            "prepare": cfg.pipeline_prepare_workers,
+            "send": cfg.pipeline_send_workers,
+            "finalize": cfg.pipeline_finalize_workers,
+        }
+        self.handlers = {
+            "scan": self.scan,
+            "prepare": self.prepare,
+            "send": self.send,
+            "finalize": self.finalize,
+        }
+        self.stats = {stage: StageStats() for stage in STAGES}
+        self.cpu_pool = ThreadPoolExecutor(
+            max_workers=cfg.pipeline_prepare_workers, thread_name_prefix="prepare"
+        )
+        # ffmpeg работает минутами, поэтому у видео свой маленький пул
+        self.video_pool = ThreadPoolExecutor(
+            max_workers=cfg.video_workers, thread_name_prefix="video"
+        )
+        # Фоновая подготовка следующих постов не отнимает потоки у текущих
+        self.prefetch_pool = ThreadPoolExecutor(
+            max_workers=cfg.prefetch_workers, thread_name_prefix="prefetch"
+        )
+        self.prefetch = PrefetchBuffer(
+            cfg.prefetch_depth,
+            self._prefetch_job,
+            lambda: self.filemanager,
+            self._duplicates_changed,
+        )
+        # У каждого бота пула своя сессия и свой лимит send_rate_per_second
+        self.bots = BotPool(cfg.send_rate_per_second)
+        self.filemanager = ChannelsFileManager(base_dir=cfg.base_dir)
+        # Подмена ботов пула одним объектом (симуляция)
+        self.bot = None
+        self.breaker = CircuitBreaker(
+            cfg.breaker_failures, cfg.breaker_cooldown_seconds
+        )
+        # Номера групп, которые сейчас в конвейере или ждут повтора
+        self.in_flight: Dict[int, Set[str]] = {}
+        self._tasks: List[asyncio.Task] = []
+        # Отложенные повторы по каналам: снимаются вместе с задачей канала
+        self._retries: Dict[int, Dict[asyncio.Task, PostJob]] = {}
+
+    def start(self):
+        for stage in STAGES:
+            for _ in range(self.concurrency[stage]):
+                self._tasks.append(asyncio.create_task(self._worker(stage)))
+        logger.info(f"Publish pipeline started: {self.concurrency}")
+
+    async def stop(self):
+        # Файлы отложенных повторов остаются в source до следующего запуска
+        retries = [task for tasks in self._retries.values() for task in tasks]
+        for task in [*self._tasks, *retries]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *retries, return_exceptions=True)
+        self._tasks.clear()
+        await self.prefetch.close()
+        self.cpu_pool.shutdown(wait=False)
+        self.video_pool.shutdown(wait=False)
+        self.prefetch_pool.shutdown(wait=False)
+        await self.bots.close()
+        logger.info("Publish pipeline stopped")
+
+    async def submit(self, channel: ChannelORM):
+        """Ставит тик канала в конвейер и ждёт окончания публикации"""
+        done = asyncio.get_running_loop().create_future()
+        await self.queues["scan"].put((channel, done))
+        await done
+
+    def summary(self) -> dict:
+        return {
+            stage: {**self.stats[stage].summary(), "queued": self.queues[stage].qsize()}
+            for stage in STAGES
+        }
+
+    def pending_retries(self) -> int:
+        return sum(len(tasks) for tasks in self._retries.values())
+
+    def drop(self, channel_id: int):
+        """Забывает канал: подготовленные посты и отложенные повторы.
+
+        Можно звать из любого потока, как и PrefetchBuffer.drop.
+        """
+        self.prefetch.drop(channel_id)
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._cancel_retries, channel_id)
+
+    def _cancel_retries(self, channel_id: int):
+        # Номера групп освобождает _retry_done отменённой задачи
+        for task in list(self._retries.get(channel_id, {})):
+            task.cancel()
+
+    def prefetch_status(self) -> dict:
+        return self.prefetch.status()
+
+    def retry_status(self) -> dict:
+        return {
+            "pending_retries": self.pending_retries(),
+            "in_flight": {key: sorted(value) for key, value in self.in_flight.items()},
+            "open_circuits": self.breaker.status(),
+        }
+
+    async def _worker(self, stage: str):
+        queue = self.queues[stage]
+        handler = self.handlers[stage]
+        next_stage = {"scan": "prepare", "prepare": "send", "send": "finalize"}.get(
+            stage
+        )
+        while True:
+            item = await queue.get()
+            started = time.perf_counter()
+            try:
+                result = await handler(item)
+            except Exception as e:
+                self.stats[stage].errors += 1
+                logger.error(f"Pipeline stage {stage} failed: {e}")
+                result = None
+                if stage != "scan":
+                    self._release(item)
+                done = item[1] if stage == "scan" else item.done
+                if not done.done():
+                    done.set_result(None)
+            finally:
+                self.stats[stage].add(time.perf_counter() - started)
+                queue.task_done()
+
+            if result is not None and next_stage is not None:
+                await self.queues[next_stage].put(result)
+
+    async def scan(self, item) -> Optional[PostJob]:
+        """Выбор следующей группы файлов канала"""
+        channel, done = item
+        logger.info(
+            f"Start posting process for channel {channel.name} (ID: {channel.id})"
+        )
+
+        if not self.breaker.allow(channel.id):
+            logger.warning(f"Circuit for channel {channel.name} is open, skip tick")
+            done.set_result(None)
+            return None
+
+        try:
+            files = await asyncio.to_thread(
+                self.filemanager.get_channel_by_name, channel.name
+            )
+            source_files = files[channel.name]["source"]
+        except Exception as e:
+            await self.on_channel_error(channel, e)
+            done.set_result(None)
+            return None
+
+        # Неизвестные типы не опубликовать никогда - сразу в except
+        source_files, unsupported = split_unsupported(source_files)
+        if unsupported:
+            logger.warning(
+                f"Unsupported files in channel {channel.name}, moving to except: "
+                f"{unsupported}"
+            )
+            await asyncio.to_thread(
+                move_files_to_except, channel, unsupported, self.filemanager
+            )
+
+        if not source_files:
+            logger.info(f"No source files to post for channel {channel.name}")
+            await self.prefetch.refill(channel, None, {})
+            self.on_drained(channel)
+            done.set_result(None)
+            return None
+
+        source_files.sort()  # Сортировка по имени файлов
+
+        # Группируем файлы по номеру и публикуем первую группу,
+        # которая ещё не в конвейере и не ждёт повтора
+        file_groups = group_files_by_number(source_files)
+        in_flight = self.in_flight.setdefault(channel.id, set())
+        number = next((n for n in file_groups if n not in in_flight), None)
+        if number is None:
+            logger.info(f"All groups of channel {channel.name} are in flight")
+            done.set_result(None)
+            return None
+
+        txt_files, media_files = separate_files_by_type(file_groups[number])
+        if not txt_files:
+            logger.warning(f"No .txt file found for {number} in channel {channel.name}")
+
+        job = PostJob(
+            channel=channel,
+            number=number,
+            files=prepare_publication_files(txt_files, media_files),
+            # Пока другие группы ждут повтора, канал не считаем опустевшим
+            last=len(file_groups) == 1 and not in_flight,
+            done=done,
+        )
+        in_flight.add(number)
+        await self.prefetch.refill(
+            channel, number, self._upcoming(file_groups, in_flight)
+        )
+        return job
+
+    def _upcoming(
+        self, file_groups: Dict[str, List[str]], in_flight: Set[str]
+    ) -> Dict[str, List[str]]:
+        """Следующие группы канала для подготовки заранее (без видео)"""
+        upcoming = {}
+        for number, files in file_groups.items():
+            if len(upcoming) >= cfg.prefetch_depth:
+                break
+            if number in in_flight:
+                continue
+            # Пережатие видео занимает минуты, его делаем только к отправке
+            if any(media_type(file) == "video" for file in files):
+                continue
+            upcoming[number] = prepare_publication_files(*separate_files_by_type(files))
+        return upcoming
+
+    async def prepare(self, job: PostJob) -> PostJob:
+        """Готовый заранее пост или подготовка на месте"""
+        try:
+            prepared = await self.prefetch.take(job)
+            if prepared is not None:
+                job.use_prepared(prepared)
+            else:
+                await self._prepare_job(job, self.cpu_pool)
+        except Exception as e:
+            job.error = e
+            job.failed_stage = "prepare"
+        return job
+
+    async def _prefetch_job(
+        self, channel: ChannelORM, number: str, files: List[str]
+    ) -> PostJob:
+        job = PostJob(
+            channel=channel, number=number, files=files, last=False, done=None
+        )
+        job.temp_tag = f"prefetch-{uuid.uuid4().hex[:8]}"
+        await self._prepare_job(job, self.prefetch_pool)
+        return job
+
+    async def _prepare_job(self, job: PostJob, pool: ThreadPoolExecutor):
+        """Чтение текста, подготовка видео и сжатие изображений в пулах потоков"""
+        loop = asyncio.get_running_loop()
+        job.text = await loop.run_in_executor(
+            pool, read_caption, job.channel, job.files, self.filemanager
+        )
+        if cfg.fingerprint_enabled:
+            job.file_ids = await self._check_duplicates(job, pool)
+            if job.duplicate:
+                return
+
+        pending = [file for file in job.files if file not in job.file_ids]
+        if any(media_type(file) == "video" for file in pending):
+            job.replacements = await loop.run_in_executor(
+                self.video_pool,
+                prepare_videos,
+                job.channel,
+                pending,
+                self.filemanager,
+            )
+        media = loop.run_in_executor(
+            pool,
+            build_media,
+            job.channel,
+            job.files,
+            job.text,
+            self.filemanager,
+            job.replacements,
+            job.file_ids,
+            job.temp_tag,
+        )
+        try:
+            job.media = await asyncio.shield(media)
+        except asyncio.CancelledError:
+            # Сжатие в потоке не прервать: копии удалим, когда оно закончится
+            media.add_done_callback(self._remove_built_media)
+            raise
+
+    @staticmethod
+    def _remove_built_media(media: asyncio.Future):
+        if media.cancelled() or media.exception() is not None:
+            return
+        # Не больше десятка unlink, а пулы к этому моменту могут быть закрыты
+        remove_temp_files(media_temp_files(media.result()))
+
+    async def _duplicates_changed(self, prepared: PostJob) -> bool:
+        """С момента подготовки в индексе могли появиться такие же файлы"""
+        policy = prepared.channel.duplicate_policy or "allow"
+        if not cfg.fingerprint_enabled or policy == "allow":
+            return False
+        duplicate, file_ids = prepared.duplicate, prepared.file_ids
+        return (
+            await self._lookup_duplicates(prepared) != file_ids
+            or prepared.duplicate != duplicate
+        )
+
+    async def _check_duplicates(
+        self, job: PostJob, pool: ThreadPoolExecutor
+    ) -> Dict[str, str]:
+        """Отпечатки поста и политика дубликатов канала.
+
+        skip - пост, целиком уже опубликованный (в любом канале), не
+        отправляется; reuse - известные файлы уходят по file_id без загрузки.
+        """
+        loop = asyncio.get_running_loop()
+        job.fingerprints = await loop.run_in_executor(
+            pool,
+            fingerprint_files,
+            job.channel,
+            job.files,
+            job.text,
+            self.filemanager,
+        )
+        return await self._lookup_duplicates(job)
+
+    async def _lookup_duplicates(self, job: PostJob) -> Dict[str, str]:
+        policy = job.channel.duplicate_policy or "allow"
+        if policy == "allow" or not job.fingerprints:
+            return {}
+
+        values = job.fingerprints.values()
+        bot_id = resolve_bot_id(job.channel)
+        known = await asyncio.to_thread(
+            FingerprintRepository.find,
+            [fp["sha256"] for fp in values],
+            [fp["dhash"] for fp in values if fp.get("dhash")],
+            bot_id,
+        )
+
+        def match(fp: dict, similar: bool):
+            row = known.get(fp["sha256"])
+            if row is None and similar:
+                row = known.get(fp.get("dhash"))
+            return row if row is not None and row.kind == fp["kind"] else None
+
+        # Похожая картинка (dHash) годится, чтобы пропустить пост, но
+        # переиспользовать file_id можно только для побайтно того же файла
+        fingerprints = job.fingerprints.items()
+        if policy == "skip":
+            job.duplicate = all(match(fp, True) is not None for _, fp in fingerprints)
+            return {}
+        matches = {file: match(fp, False) for file, fp in fingerprints}
+        # file_id действителен только у бота, который загрузил файл
+        primary = primary_bot_id()
+        return {
+            file: row.file_id
+            for file, row in matches.items()
+            if row is not None and row.file_id and (row.bot_id or primary) == bot_id
+        }
+
+    async def send(self, job: PostJob) -> PostJob:
+        """Отправка поста в Telegram с ограничением частоты"""
+        if job.error is not None or job.duplicate:
+            return job
+        if not job.media and job.text is None:
+            job.error = ValueError(f"Nothing to publish in group {job.number}")
+            return job
+
+        logger.info(f"Publishing files {job.files} to channel {job.channel.name}")
+        bot_id = resolve_bot_id(job.channel)
+        await self.bots.limiter(bot_id).acquire()
+        # Первая отправка не должна грузить aiogram в цикле событий
+        await warm_imports()
+        try:
+            bot = self._get_bot(bot_id)
+            if job.media:
+                job.messages = await bot.send_post(job.channel.chat_id, media=job.media)
+            else:
+                await bot.send_message(
+                    job.channel.chat_id,
+                    text=job.text,
+                    parse_mode=job.channel.parse_mode,
+                )
+        except Exception as e:
+            job.error = e
+            job.failed_stage = "send"
+        return job
+
+    async def finalize(self, job: PostJob) -> None:
+        """Перенос файлов в done, повтор или dead letter, деактивация канала"""
+        channel = job.channel
+        if job.duplicate:
+            await asyncio.to_thread(
+                move_files_to_done, channel, job.files, self.filemanager
+            )
+            logger.info(f"Skipped duplicate {job.number} in channel {channel.name}")
+        elif job.error is None:
+            self.breaker.success(channel.id)
+            await asyncio.to_thread(
+                move_files_to_done, channel, job.files, self.filemanager
+            )
+            if job.fingerprints:
+                await asyncio.to_thread(self._record_fingerprints, job)
+            logger.info(
+                f"Successfully published {job.number} in channel {channel.name}"
+            )
+        else:
+            self.breaker.failure(channel.id)
+            error_class, retry_after = classify(job.error)
+            if error_class in RETRYABLE and job.attempts + 1 < cfg.retry_max_attempts:
+                # Файлы остаются в source, тик канала не ждёт повтора
+                self._schedule_retry(job, backoff_delay(job.attempts, retry_after))
+                if not job.done.done():
+                    job.done.set_result(None)
+                return
+
+            logger.error(
+                f"Failed to publish files for {channel.name} "
+                f"({error_class}, attempt {job.attempts + 1}): {job.error}"
+            )
+            await asyncio.to_thread(self._dead_letter, job, error_class)
+
+        if job.media:
+            await asyncio.to_thread(remove_temp_files, job.temp_files())
+
+        self._release(job)
+        if job.last:
+            self.on_drained(channel)
+        if not job.done.done():
+            job.done.set_result(None)
+
+    def _schedule_retry(self, job: PostJob, delay: float):
+        stage = job.failed_stage or "send"
+        logger.warning(
+            f"Retrying {job.number} of channel {job.channel.name} from {stage} "
+            f"in {delay:.1f}s (attempt {job.attempts + 2}): {job.error}"
+        )
+        job.attempts += 1
+        job.error = None
+        job.failed_stage = None
+
+        async def retry_later():
+            await asyncio.sleep(delay)
+            # За время ожидания канал могли выключить, удалить или отдать
+            if not await asyncio.to_thread(self.owns_channel, job.channel):
+                logger.info(
+                    f"Channel {job.channel.name} is no longer ours, "
+                    f"drop retry of {job.number}"
+                )
+                self._abandon(job)
+                return
+            await self.queues[stage].put(job)
+
+        task = asyncio.create_task(retry_later())
+        self._retries.setdefault(job.channel.id, {})[task] = job
+        task.add_done_callback(functools.partial(self._retry_done, job))
+
+    def _retry_done(self, job: PostJob, task: asyncio.Task):
+        retries = self._retries.get(job.channel.id, {})
+        retries.pop(task, None)
+        if not retries:
+            self._retries.pop(job.channel.id, None)
+        # Отменённый повтор больше не держит номер группы и temp-файлы
+        if task.cancelled():
+            self._abandon(job)
+
+    def _abandon(self, job: PostJob):
+        self._release(job)
+        if job.media:
+            self.loop.run_in_executor(None, remove_temp_files, job.temp_files())
+
+    def _dead_letter(self, job: PostJob, error_class: str):
+        """Файлы группы в except, запись о посте - в dead_letters"""
+        move_files_to_except(job.channel, job.files, self.filemanager)
+        DeadLetterRepository.add(
+            DeadLetterORM(
+                channel_id=job.channel.id,
+                channel_name=job.channel.name,
+                number=job.number,
+                files="\n".join(job.files),
+                error_class=error_class,
+                error=str(job.error),
+                attempts=job.attempts + 1,
+                created_at=time.time(),
+            )
+        )
+
+    def _record_fingerprints(self, job: PostJob):
+        """Запоминаем опубликованное вместе с file_id загруженных файлов"""
+        sources = media_sources(job.files, job.replacements)
+        file_ids = {}
+        if isinstance(job.messages, list) and len(job.messages) == len(sources):
+            for source, message in zip(sources, job.messages):
+                # Видео, порезанное на части, по одному file_id не повторить
+                if sources.count(source) == 1:
+                    file_ids[source] = extract_file_id(message)
+
+        now = time.time()
+        FingerprintRepository.add_many(
+            [
+                {
+                    "sha256": fp["sha256"],
+                    "dhash": fp.get("dhash"),
+                    "kind": fp["kind"],
+                    "channel_id": job.channel.id,
+                    "file": file,
+                    "file_id": file_ids.get(file),
+                    "bot_id": resolve_bot_id(job.channel),
+                    "published_at": now,
+                }
+                for file, fp in job.fingerprints.items()
+            ]
+        )
+
+    def _release(self, job: PostJob):
+        self.in_flight.get(job.channel.id, set()).discard(job.number)
+
+    def _get_bot(self, bot_id: str) -> "CustomBot":
+        if self.bot is not None:
+            return self.bot
+        return self.bots.get(bot_id)
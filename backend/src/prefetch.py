@@ -0,0 +1,198 @@
+import asyncio
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from loguru import logger
+
+from bot_pool import resolve_bot_id
+from channels_files import ChannelsFileManager
+from models import ChannelORM
+from publishing import remove_temp_files
+
+if TYPE_CHECKING:
+    from pipeline import PostJob
+
+Signature = Tuple[Tuple[str, int, int], ...]
+
+
+def group_signature(
+    channel: ChannelORM, files: List[str], filemanager: ChannelsFileManager
+) -> Optional[Signature]:
+    """(имя, размер, mtime_ns) файлов группы; None - какого-то файла нет"""
+    signature = []
+    for file in files:
+        try:
+            stat = filemanager.file_stat(channel.name, "source", file)
+        except OSError:
+            return None
+        signature.append((file, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def channel_config(channel: ChannelORM) -> tuple:
+    # Настройки канала, от которых зависит подготовленный пост
+    return (channel.parse_mode, channel.duplicate_policy, resolve_bot_id(channel))
+
+
+class PrefetchBuffer:
+    """Подготовленные заранее следующие посты каналов.
+
+    Между тиками в фоне готовятся prefetch_depth следующих групп канала,
+    и на тике остаётся только отправка. Пост годен, пока у файлов группы
+    те же имена, размеры и mtime, что и до подготовки, и не поменялись
+    настройки канала.
+    """
+
+    def __init__(
+        self,
+        depth: int,
+        prepare: Callable[[ChannelORM, str, List[str]], Awaitable["PostJob"]],
+        filemanager: Callable[[], ChannelsFileManager],
+        is_stale: Callable[["PostJob"], Awaitable[bool]],
+    ):
+        self.depth = depth
+        self.prepare = prepare
+        self.filemanager = filemanager
+        # Проверка того, что не видно по файлам (индекс дубликатов)
+        self.is_stale = is_stale
+        # id канала -> номер группы -> задача подготовки (подпись, пост)
+        self.entries: Dict[int, Dict[str, asyncio.Task]] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "late": 0,
+            "invalidated": 0,
+            "failed": 0,
+        }
+        self.loop = asyncio.get_running_loop()
+        self._cleanups: Set[asyncio.Task] = set()
+
+    async def refill(
+        self, channel: ChannelORM, number: str, upcoming: Dict[str, List[str]]
+    ):
+        """Оставляет текущую группу и следующие depth, остальное выбрасывает"""
+        if self.depth <= 0:
+            return
+        entries = self.entries.setdefault(channel.id, {})
+        wanted = dict(list(upcoming.items())[: self.depth])
+
+        stale = [
+            entries.pop(n) for n in list(entries) if n != number and n not in wanted
+        ]
+        for next_number, files in wanted.items():
+            if next_number not in entries:
+                entries[next_number] = asyncio.create_task(
+                    self._prepare(channel, next_number, files)
+                )
+        if not entries:
+            del self.entries[channel.id]
+        await self._discard(stale)
+
+    async def take(self, job: "PostJob") -> Optional["PostJob"]:
+        """Готовый пост группы задания или None, если его нет или он устарел"""
+        task = self.entries.get(job.channel.id, {}).pop(job.number, None)
+        if task is None:
+            self.stats["misses"] += 1
+            return None
+
+        if not task.done():
+            # Фоновая подготовка не успела: пост готовится на месте в пуле
+            # текущих постов, а не ждёт медленного пула prefetch
+            self.stats["late"] += 1
+            task.cancel()
+            return None
+        try:
+            signature, config, prepared = task.result()
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(
+                f"Prefetch of {job.number} in {job.channel.name} failed: {e}"
+            )
+            return None
+        if prepared is None:
+            self.stats["misses"] += 1
+            return None
+
+        current = await asyncio.to_thread(
+            group_signature, job.channel, job.files, self.filemanager()
+        )
+        if (
+            prepared.files != job.files
+            or current != signature
+            or config != channel_config(job.channel)
+            or await self.is_stale(prepared)
+        ):
+            logger.info(f"Prefetched {job.number} in {job.channel.name} is stale")
+            await self.discard(prepared)
+            return None
+
+        self.stats["hits"] += 1
+        return prepared
+
+    async def discard(self, prepared: "PostJob"):
+        """Устаревший пост: удаляем его сжатые копии"""
+        self.stats["invalidated"] += 1
+        await asyncio.to_thread(remove_temp_files, prepared.temp_files())
+
+    def drop(self, channel_id: int):
+        """Выбрасывает посты канала: он выключен, удалён или ушёл к другому воркеру.
+
+        Можно звать из любого потока, работа уходит в цикл событий буфера.
+        """
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._drop, channel_id)
+
+    def _drop(self, channel_id: int):
+        tasks = list(self.entries.pop(channel_id, {}).values())
+        if tasks:
+            cleanup = asyncio.create_task(self._discard(tasks))
+            self._cleanups.add(cleanup)
+            cleanup.add_done_callback(self._cleanups.discard)
+
+    def status(self) -> dict:
+        return {
+            **self.stats,
+            "buffered": sum(len(entries) for entries in self.entries.values()),
+        }
+
+    async def close(self):
+        tasks = [task for entries in self.entries.values() for task in entries.values()]
+        self.entries.clear()
+        await self._discard(tasks)
+        for task in self._cleanups:
+            task.cancel()
+
+    async def _prepare(self, channel: ChannelORM, number: str, files: List[str]):
+        # Подпись снимается до чтения файлов: правка во время подготовки
+        # тоже сделает пост устаревшим
+        signature = await asyncio.to_thread(
+            group_signature, channel, files, self.filemanager()
+        )
+        if signature is None:
+            return None, None, None
+        config = channel_config(channel)
+        return signature, config, await self.prepare(channel, number, files)
+
+    async def _discard(self, tasks: Iterable[asyncio.Task]):
+        for task in tasks:
+            if task.done():
+                await self._cleanup(task)
+            else:
+                # Копии, которые успеет сжать поток, удалит сама подготовка
+                task.cancel()
+
+    async def _cleanup(self, task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None:
+            return
+        prepared = task.result()[2]
+        if prepared is not None:
+            await self.discard(prepared)
@@ -0,0 +1,210 @@
+import asyncio
+import contextlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from settings import Settings, get_settings
+
+cfg: Settings = get_settings()
+
+# Потоки, в которых идёт работа тика: пулы конвейера и asyncio.to_thread
+PIPELINE_THREADS = ("prepare", "prefetch", "video", "asyncio_")
+
+
+def idle_worker(frame) -> bool:
+    """Поток пула ждёт задачу: в профиле это шум, а не работа тика"""
+    code = frame.f_code
+    return code.co_name == "_worker" and code.co_filename.endswith(
+        os.path.join("concurrent", "futures", "thread.py")
+    )
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик: раз в interval снимает стеки потоков тика.
+
+    Работает в отдельном потоке и не требует перезапуска цикла событий.
+    Снимаются поток цикла событий (создавший профилировщик) и потоки с
+    именами из prefixes; корнем стека идёт имя потока. Цикл и пулы общие,
+    поэтому одновременные сессии пересекаются: каждая видит и работу
+    других тиков, идущих в это время.
+    """
+
+    def __init__(self, interval: float, prefixes: Tuple[str, ...] = PIPELINE_THREADS):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.prefixes = prefixes
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _threads(self) -> Dict[int, str]:
+        # Пулы создают потоки по мере надобности, поэтому список на каждом шаге
+        return {
+            thread.ident: thread.name
+            for thread in threading.enumerate()
+            if thread.ident == self.thread_id or thread.name.startswith(self.prefixes)
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            threads = self._threads()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in threads or idle_worker(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(threads[thread_id])
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """Формат collapsed stacks для flamegraph.pl / speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.items())
+
+    def top_functions(self, limit: int = 30) -> str:
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        all_samples = sum(self.stacks.values()) or 1
+        lines = [
+            f"duration: {self.duration:.3f}s, samples: {self.samples}, "
+            f"interval: {self.interval * 1000:.1f}ms",
+            f"{'own %':>7} {'total %':>8}  function",
+        ]
+        for frame, count in own.most_common(limit):
+            lines.append(
+                f"{count / all_samples * 100:7.2f} {total[frame] / all_samples * 100:8.2f}  {frame}"
+            )
+        return "\n".join(lines)
+
+
+class ProfilingControl:
+    """Включение профилирования следующих N запусков постинга или запросов API"""
+
+    def __init__(self):
+        self.posting_runs = 0
+        self.route_pattern: Optional[re.Pattern] = None
+        self.route_count = 0
+        self.written: List[str] = []
+        self._lock = threading.Lock()
+
+    def arm_posting(self, runs: int):
+        self.posting_runs = runs
+        logger.warning(f"Profiling next {runs} posting runs")
+
+    def arm_routes(self, pattern: str, count: int):
+        self.route_pattern = re.compile(pattern)
+        self.route_count = count
+        logger.warning(f"Profiling next {count} requests matching {pattern!r}")
+
+    def disarm(self):
+        self.posting_runs = 0
+        self.route_pattern = None
+        self.route_count = 0
+
+    def status(self) -> dict:
+        return {
+            "posting_runs": self.posting_runs,
+            "route_pattern": self.route_pattern.pattern if self.route_pattern else None,
+            "route_count": self.route_count,
+            "profiles": self.written[-50:],
+        }
+
+    def posting(self, channel_name: str):
+        """Контекст профилирования тика канала; без включения - nullcontext"""
+        if not self.posting_runs:
+            return contextlib.nullcontext()
+        with self._lock:
+            if self.posting_runs <= 0:
+                return contextlib.nullcontext()
+            self.posting_runs -= 1
+        return self.session(f"posting-{channel_name}")
+
+    def request(self, path: str):
+        if self.route_pattern is None or not self.route_pattern.search(path):
+            return contextlib.nullcontext()
+        with self._lock:
+            if self.route_count <= 0:
+                self.route_pattern = None
+                return contextlib.nullcontext()
+            self.route_count -= 1
+            if self.route_count == 0:
+                self.route_pattern = None
+        return self.session(f"request-{path.strip('/').replace('/', '_') or 'root'}")
+
+    @contextlib.asynccontextmanager
+    async def session(self, label: str):
+        profiler = SamplingProfiler(cfg.profile_interval_ms / 1000)
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            # Запись на диск не должна задерживать цикл событий
+            await asyncio.to_thread(self._write, label, profiler)
+
+    def _write(self, label: str, profiler: SamplingProfiler):
+        directory = os.path.join(cfg.logs_path, "profiles")
+        os.makedirs(directory, exist_ok=True)
+        safe_label = re.sub(r"[^\w.-]", "_", label)
+        base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_label}")
+
+        with open(base + ".folded", "w") as f:
+            f.write(profiler.folded())
+        with open(base + ".txt", "w") as f:
+            f.write(profiler.top_functions())
+
+        self.written.append(base)
+        logger.info(
+            f"Profile {label} written to {base}.folded ({profiler.samples} samples)"
+        )
+
+
+class ProfilingMiddleware:
+    """ASGI-мидлварь: при выключенном профилировании - одна проверка атрибута"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or profiling.route_pattern is None:
+            await self.app(scope, receive, send)
+            return
+
+        async with profiling.request(scope["path"]):
+            await self.app(scope, receive, send)
+
+
+profiling = ProfilingControl()
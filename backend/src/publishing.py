@@ -0,0 +1,380 @@
+import html
+import io
+import os
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from loguru import logger
+
+from channels_files import ChannelsFileManager
+from models import ChannelORM
+from settings import Settings, get_settings
+
+if TYPE_CHECKING:
+    from aiogram.types import InputMedia
+
+cfg: Settings = get_settings()
+
+# Ограничения Telegram для sendPhoto / sendMediaGroup
+MAX_PHOTO_SIZE = 5 * 1024 * 1024
+MAX_IMAGE_SIDE = 1920
+# Длина подписи к медиа и текста сообщения после разбора разметки
+MAX_CAPTION_LENGTH = 1024
+MAX_TEXT_LENGTH = 4096
+
+HTML_TAG = re.compile(r"<[^>]+>")
+MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+MARKDOWN_MARK = re.compile(r"\\(.)|[*_~|`]")
+
+MEDIA_TYPES = {
+    ".jpg": "photo",
+    ".jpeg": "photo",
+    ".png": "photo",
+    ".webp": "photo",
+    ".mp4": "video",
+    ".mov": "video",
+    ".mkv": "video",
+    ".webm": "video",
+    ".gif": "animation",
+    ".pdf": "document",
+    ".zip": "document",
+    ".doc": "document",
+    ".docx": "document",
+    ".xls": "document",
+    ".xlsx": "document",
+    ".csv": "document",
+    ".epub": "document",
+}
+
+
+def group_files_by_number(files: List[str]) -> Dict[str, List[str]]:
+    """Группируем файлы по числовому идентификатору (например, 0001, 0035)"""
+    file_groups = {}
+
+    for file in files:
+        # Извлекаем базовый номер (до подчеркивания или точки)
+        base_number = file.split(".")[0].split("_")[0]
+
+        if base_number not in file_groups:
+            file_groups[base_number] = []
+
+        file_groups[base_number].append(file)
+
+    logger.debug(f"Grouped files: {file_groups}")
+    return file_groups
+
+
+def media_type(file: str) -> Optional[str]:
+    """Тип медиа Telegram по расширению файла или None для неизвестных"""
+    return MEDIA_TYPES.get(os.path.splitext(file)[1].lower())
+
+
+def split_unsupported(files: List[str]) -> (List[str], List[str]):
+    """Отделяем файлы, которые нельзя опубликовать (ни текст, ни медиа)"""
+    supported, unsupported = [], []
+    for file in files:
+        if file.endswith(".txt") or media_type(file) is not None:
+            supported.append(file)
+        else:
+            unsupported.append(file)
+    return supported, unsupported
+
+
+def separate_files_by_type(file_group: List[str]) -> (List[str], List[str]):
+    """Разделяем файлы на текстовые (.txt) и медиа (фото, видео, документы)"""
+    txt_files = [f for f in file_group if f.endswith(".txt")]
+    media_files = [f for f in file_group if media_type(f) is not None]
+
+    logger.debug(
+        f"Separated files: {len(txt_files)} .txt files, {len(media_files)} media files"
+    )
+    return txt_files, media_files
+
+
+def select_album(media_files: List[str]) -> List[str]:
+    """Ограничения альбомов Telegram: фото и видео можно смешивать,
+    документы - только с документами, анимация отправляется отдельно"""
+    if not media_files:
+        return []
+
+    first = media_type(media_files[0])
+    if first == "animation":
+        return media_files[:1]
+
+    compatible = {"photo", "video"} if first in ("photo", "video") else {first}
+    album = [f for f in media_files if media_type(f) in compatible]
+    return album[: min(cfg.max_media_per_post, 10)]
+
+
+def prepare_publication_files(
+    txt_files: List[str], media_files: List[str]
+) -> List[str]:
+    """Подготовка списка файлов для публикации (1 txt + один альбом)"""
+    # Сортируем медиа по имени, остальные уйдут следующим постом
+    media_files.sort()
+    media_files = select_album(media_files)
+
+    publication_files = txt_files + media_files
+    logger.debug(f"Prepared publication files: {publication_files}")
+    return publication_files
+
+
+def temp_dir(file_path: str) -> str:
+    """Каталог temp рядом с source канала для сжатых и нарезанных копий"""
+    return os.path.join(os.path.dirname(os.path.dirname(file_path)), "temp")
+
+
+def temp_path(file_path: str, ext: str = ".jpg", tag: str = "") -> str:
+    # Исходное расширение остаётся в имени: 0001_1.png и 0001_1.jpg не столкнутся
+    name = os.path.basename(file_path) + (f".{tag}" if tag else "") + ext
+    return os.path.join(temp_dir(file_path), name)
+
+
+def compress_image(
+    file_path: str, max_side: int = MAX_IMAGE_SIDE, tag: str = ""
+) -> str:
+    """Сжимаем изображение, если его размер больше 5 МБ.
+
+    tag отличает копии разных подготовок одного файла (см. prefetch).
+    """
+    logger.info(f"Compressing image: {file_path}")
+
+    # Pillow импортируется при первом сжатии, а не при старте приложения
+    from PIL import Image, ImageOps
+
+    with Image.open(file_path) as img:
+        original_width, original_height = img.size
+        logger.info(f"Original image size: {original_width}x{original_height}")
+
+        # JPEG декодируется сразу в масштабе 1/2, 1/4 или 1/8 (в DCT-домене),
+        # поэтому 40-мегапиксельное фото не разворачивается в память целиком
+        if img.format == "JPEG":
+            img.draft("RGB", (max_side, max_side))
+
+        # Поворот по EXIF после draft: работаем уже с уменьшенной картинкой
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            # Преобразуем изображения в RGB, если они с альфа-каналом
+            img = img.convert("RGB")
+
+        # Уменьшаем размер изображения пропорционально
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        # Подбираем качество в памяти и пишем на диск только итоговый вариант
+        for quality in (85, 75, 65, 55):
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=quality)
+            if buffer.tell() <= MAX_PHOTO_SIZE:
+                break
+        else:
+            logger.warning(f"Unable to compress {file_path} under 5MB")
+
+    new_file_path = temp_path(file_path, tag=tag)
+    os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
+    with open(new_file_path, "wb") as f:
+        f.write(buffer.getbuffer())
+
+    logger.info(
+        f"Compressed image saved to: {new_file_path}, "
+        f"{img.width}x{img.height}, quality {quality}, "
+        f"new size: {buffer.tell() / 1024 / 1024:.2f} MB"
+    )
+    return new_file_path
+
+
+def media_temp_files(media: List["InputMedia"]) -> List[str]:
+    """Пути загружаемых файлов альбома (без отправок по file_id)"""
+    return [item.media.path for item in media if hasattr(item.media, "path")]
+
+
+def remove_temp_files(media_paths: List[str]):
+    """Удаляем сжатые копии после отправки поста"""
+    for path in media_paths:
+        if os.path.basename(os.path.dirname(path)) != "temp":
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def move_files_to_done(
+    channel: ChannelORM,
+    files: List[str],
+    filemanager: Optional[ChannelsFileManager] = None,
+):
+    """Перемещаем файлы в папку done"""
+    filemanager = filemanager or ChannelsFileManager(base_dir=cfg.base_dir)
+    filemanager.move_files(channel.name, files, "source", "done")
+
+
+def move_files_to_except(
+    channel: ChannelORM,
+    files: List[str],
+    filemanager: Optional[ChannelsFileManager] = None,
+):
+    """Перемещаем файлы в папку except"""
+    filemanager = filemanager or ChannelsFileManager(base_dir=cfg.base_dir)
+    filemanager.move_files(channel.name, files, "source", "except")
+
+
+def read_caption(
+    channel: ChannelORM,
+    files: List[str],
+    filemanager: Optional[ChannelsFileManager] = None,
+) -> Optional[str]:
+    """Текст поста из .txt файла группы.
+
+    Слишком длинный текст - ValueError: Telegram его не примет, и пост
+    лучше отбраковать при подготовке, а не на отправке.
+    """
+    txt_file = next((f for f in files if f.endswith(".txt")), None)
+    if txt_file is None:
+        logger.warning(f"No .txt file found for channel {channel.name}")
+        return None
+
+    filemanager = filemanager or ChannelsFileManager(base_dir=cfg.base_dir)
+    text = filemanager.read_text(channel.name, "source", txt_file)
+
+    # Подписи к медиа уходят с разметкой бота по умолчанию (Markdown)
+    if any(media_type(file) for file in files):
+        limit, length = MAX_CAPTION_LENGTH, text_length(text, "markdown")
+    else:
+        limit, length = MAX_TEXT_LENGTH, text_length(text, channel.parse_mode)
+    if length > limit:
+        raise ValueError(
+            f"Text of {txt_file} is {length} characters long, Telegram limit is {limit}"
+        )
+    return text
+
+
+def text_length(text: str, parse_mode: Optional[str]) -> int:
+    """Длина текста без разметки в UTF-16, как её считает Telegram"""
+    mode = (parse_mode or "").lower()
+    if mode == "html":
+        text = html.unescape(HTML_TAG.sub("", text))
+    elif mode.startswith("markdown"):
+        text = MARKDOWN_LINK.sub(r"\1", text)
+        text = MARKDOWN_MARK.sub(lambda match: match.group(1) or "", text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def prepare_videos(
+    channel: ChannelORM,
+    files: List[str],
+    filemanager: Optional[ChannelsFileManager] = None,
+) -> Dict[str, List[str]]:
+    """Пережимает или режет видео больше лимита загрузки.
+
+    Возвращает замены: имя исходного файла -> пути готовых частей.
+    Запускается в отдельном пуле: ffmpeg может работать минутами.
+    """
+    from video import fit_video
+
+    filemanager = filemanager or ChannelsFileManager(base_dir=cfg.base_dir)
+    max_bytes = cfg.max_upload_mb * 1024 * 1024
+    replacements = {}
+
+    for file in files:
+        if media_type(file) != "video":
+            continue
+        if filemanager.file_size(channel.name, "source", file) <= max_bytes:
+            continue
+        file_path = filemanager.file_path(channel.name, "source", file)
+        replacements[file] = fit_video(file_path, max_bytes, temp_dir(file_path))
+
+    return replacements
+
+
+def media_paths(
+    channel: ChannelORM,
+    file: str,
+    kind: str,
+    replacements: Dict[str, List[str]],
+    filemanager: ChannelsFileManager,
+    temp_tag: str = "",
+) -> List[str]:
+    """Пути для загрузки файла: сжатая копия, части видео или исходник"""
+    file_path = filemanager.file_path(channel.name, "source", file)
+    size = filemanager.file_size(channel.name, "source", file)
+
+    if kind == "photo":
+        # Если размер изображения больше 5 МБ, уменьшаем его
+        if size > MAX_PHOTO_SIZE:
+            file_path = compress_image(file_path, tag=temp_tag)
+        return [file_path]
+    if file in replacements:
+        return replacements[file]
+    if size > cfg.max_upload_mb * 1024 * 1024:
+        raise ValueError(f"{file} is larger than {cfg.max_upload_mb} MB")
+    return [file_path]
+
+
+def media_sources(
+    files: List[str], replacements: Optional[Dict[str, List[str]]] = None
+) -> List[str]:
+    """Исходный файл для каждого элемента альбома в порядке build_media"""
+    replacements = replacements or {}
+    sources = []
+    for file in files:
+        if media_type(file) is not None:
+            sources.extend([file] * len(replacements.get(file, [file])))
+    return sources
+
+
+def build_media(
+    channel: ChannelORM,
+    files: List[str],
+    text: Optional[str],
+    filemanager: Optional[ChannelsFileManager] = None,
+    replacements: Optional[Dict[str, List[str]]] = None,
+    file_ids: Optional[Dict[str, str]] = None,
+    temp_tag: str = "",
+) -> List["InputMedia"]:
+    """Собираем альбом, сжимая слишком большие изображения"""
+    from aiogram.types import (
+        FSInputFile,
+        InputMediaAnimation,
+        InputMediaDocument,
+        InputMediaPhoto,
+        InputMediaVideo,
+    )
+
+    filemanager = filemanager or ChannelsFileManager(base_dir=cfg.base_dir)
+    replacements = replacements or {}
+    file_ids = file_ids or {}
+    media = []
+
+    for file in files:
+        kind = media_type(file)
+        if kind is None:
+            continue
+
+        if file in file_ids:
+            # Файл уже есть в Telegram - отправляем по file_id без загрузки
+            inputs = [file_ids[file]]
+        else:
+            # Файл читается и отправляется кусками, целиком в память не попадает
+            inputs = [
+                FSInputFile(path, chunk_size=cfg.upload_chunk_size)
+                for path in media_paths(
+                    channel, file, kind, replacements, filemanager, temp_tag
+                )
+            ]
+
+        for input_file in inputs:
+            if kind == "photo":
+                item = InputMediaPhoto(media=input_file, caption=text)
+            elif kind == "video":
+                item = InputMediaVideo(
+                    media=input_file, caption=text, supports_streaming=True
+                )
+            elif kind == "animation":
+                item = InputMediaAnimation(media=input_file, caption=text)
+            else:
+                item = InputMediaDocument(media=input_file, caption=text)
+            media.append(item)
+
+    if len(media) > 10:
+        raise ValueError(f"Album of {len(media)} items exceeds Telegram limit of 10")
+    return media
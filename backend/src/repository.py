@@ -1,9 +1,11 @@
-from typing import List
+import time
+from typing import Dict, List, Optional, Set
 
-from sqlalchemy import insert, text
+from sqlalchemy import delete, func, insert, or_, select, text, update
+from sqlalchemy.exc import IntegrityError
 
 from database import create_tables, drop_tables, session_factory
-from models import Base, ChannelORM, UserORM
+from models import Base, ChannelORM, DeadLetterORM, FingerprintORM, LeaseORM, UserORM
 
 
 class CRUDRepository:
@@ -61,11 +63,263 @@ class ChannelRepository(CRUDRepository):
         with session_factory() as session:
             return session.query(cls.model).filter(cls.model.active == True).all()
 
+    @classmethod
+    def get_all_rows(cls) -> List[dict]:
+        """Все каналы словарями столбцов, без сборки ORM-объектов"""
+        with session_factory() as session:
+            rows = session.execute(select(cls.model.__table__)).mappings()
+            return [dict(row) for row in rows]
+
+    @classmethod
+    def bot_loads(cls) -> Dict[str, int]:
+        """Число каналов на каждом назначенном боте"""
+        with session_factory() as session:
+            rows = session.execute(
+                select(cls.model.bot_id, func.count())
+                .where(cls.model.bot_id.is_not(None))
+                .group_by(cls.model.bot_id)
+            )
+            return {bot_id: count for bot_id, count in rows}
+
+    @classmethod
+    def set_bot_id(cls, id: int, bot_id: Optional[str]):
+        with session_factory() as session:
+            session.execute(
+                update(cls.model).where(cls.model.id == id).values(bot_id=bot_id)
+            )
+            session.commit()
+
 
 class UserRepository(CRUDRepository):
     model = UserORM
 
 
+class DeadLetterRepository(CRUDRepository):
+    model = DeadLetterORM
+
+    @classmethod
+    def get_filtered(
+        cls,
+        channel_id: Optional[int] = None,
+        ids: Optional[List[int]] = None,
+        limit: Optional[int] = None,
+    ) -> List[DeadLetterORM]:
+        with session_factory() as session:
+            query = select(cls.model).order_by(cls.model.id)
+            if channel_id is not None:
+                query = query.where(cls.model.channel_id == channel_id)
+            if ids is not None:
+                query = query.where(cls.model.id.in_(ids))
+            if limit is not None:
+                query = query.limit(limit)
+            return list(session.execute(query).scalars())
+
+    @classmethod
+    def delete_many(cls, ids: List[int]):
+        with session_factory() as session:
+            session.execute(delete(cls.model).where(cls.model.id.in_(ids)))
+            session.commit()
+
+
+class LeaseRepository(CRUDRepository):
+    model = LeaseORM
+
+    @classmethod
+    def acquire(cls, name: str, owner: str, ttl: float) -> bool:
+        """Захват или продление аренды, если она свободна, просрочена или уже наша"""
+        now = time.time()
+        with session_factory() as session:
+            result = session.execute(
+                update(cls.model)
+                .where(
+                    cls.model.name == name,
+                    or_(cls.model.owner == owner, cls.model.expires_at < now),
+                )
+                .values(owner=owner, expires_at=now + ttl)
+            )
+            if result.rowcount:
+                session.commit()
+                return True
+
+            try:
+                session.add(cls.model(name=name, owner=owner, expires_at=now + ttl))
+                session.commit()
+                return True
+            except IntegrityError:
+                # Аренду успел создать другой воркер
+                session.rollback()
+                return False
+
+    @classmethod
+    def acquire_many(
+        cls, names: List[str], owner: str, ttl: float, chunk: int = 500
+    ) -> Set[str]:
+        """Пакетный захват аренд при старте, возвращает захваченные имена"""
+        acquired = set()
+        for i in range(0, len(names), chunk):
+            batch = names[i : i + chunk]
+            now = time.time()
+            with session_factory() as session:
+                session.execute(
+                    update(cls.model)
+                    .where(
+                        cls.model.name.in_(batch),
+                        or_(cls.model.owner == owner, cls.model.expires_at < now),
+                    )
+                    .values(owner=owner, expires_at=now + ttl)
+                )
+                rows = session.execute(
+                    select(cls.model.name, cls.model.owner).where(
+                        cls.model.name.in_(batch)
+                    )
+                ).all()
+                session.commit()
+
+            existing = {name for name, _ in rows}
+            acquired.update(name for name, row_owner in rows if row_owner == owner)
+            missing = [name for name in batch if name not in existing]
+            if not missing:
+                continue
+            try:
+                with session_factory() as session:
+                    session.execute(
+                        insert(cls.model),
+                        [
+                            {"name": name, "owner": owner, "expires_at": now + ttl}
+                            for name in missing
+                        ],
+                    )
+                    session.commit()
+                acquired.update(missing)
+            except IntegrityError:
+                # Часть аренд успел создать другой воркер - добираем по одной
+                acquired.update(
+                    name for name in missing if cls.acquire(name, owner, ttl)
+                )
+        return acquired
+
+    @classmethod
+    def available(cls, names: List[str], chunk: int = 500) -> List[str]:
+        """Имена из names, у которых аренды нет или она просрочена"""
+        live = set()
+        now = time.time()
+        with session_factory() as session:
+            for i in range(0, len(names), chunk):
+                live.update(
+                    session.execute(
+                        select(cls.model.name).where(
+                            cls.model.name.in_(names[i : i + chunk]),
+                            cls.model.expires_at >= now,
+                        )
+                    ).scalars()
+                )
+        return [name for name in names if name not in live]
+
+    @classmethod
+    def renew(cls, owner: str, ttl: float) -> Set[str]:
+        """Продление всех аренд владельца, возвращает их имена"""
+        now = time.time()
+        with session_factory() as session:
+            session.execute(
+                update(cls.model)
+                .where(cls.model.owner == owner)
+                .values(expires_at=now + ttl)
+            )
+            session.commit()
+            names = session.execute(
+                select(cls.model.name).where(cls.model.owner == owner)
+            ).scalars()
+            return set(names)
+
+    @classmethod
+    def holds(cls, name: str, owner: str) -> bool:
+        with session_factory() as session:
+            obj = session.get(cls.model, name)
+            return (
+                obj is not None and obj.owner == owner and obj.expires_at >= time.time()
+            )
+
+    @classmethod
+    def release(cls, name: str, owner: str | None = None):
+        with session_factory() as session:
+            query = delete(cls.model).where(cls.model.name == name)
+            if owner is not None:
+                query = query.where(cls.model.owner == owner)
+            session.execute(query)
+            session.commit()
+
+    @classmethod
+    def release_all(cls, owner: str):
+        with session_factory() as session:
+            session.execute(delete(cls.model).where(cls.model.owner == owner))
+            session.commit()
+
+
+class FingerprintRepository(CRUDRepository):
+    model = FingerprintORM
+
+    @classmethod
+    def find(
+        cls, sha256s: List[str], dhashes: List[str], bot_id: Optional[str] = None
+    ) -> Dict[str, FingerprintORM]:
+        """Опубликованные отпечатки по индексам sha256 и dhash.
+
+        Ключ результата - совпавший хеш; при нескольких публикациях
+        предпочитается запись с file_id бота bot_id, затем любая с file_id.
+        """
+        if not sha256s and not dhashes:
+            return {}
+        with session_factory() as session:
+            rows = session.execute(
+                select(cls.model).where(
+                    or_(cls.model.sha256.in_(sha256s), cls.model.dhash.in_(dhashes))
+                )
+            ).scalars()
+            wanted = set(sha256s) | set(dhashes)
+
+            def rank(row: FingerprintORM) -> int:
+                return bool(row.file_id) + (bool(row.file_id) and row.bot_id == bot_id)
+
+            found = {}
+            for row in rows:
+                for key in (row.sha256, row.dhash):
+                    if key not in wanted:
+                        continue
+                    if key not in found or rank(row) > rank(found[key]):
+                        found[key] = row
+            return found
+
+    @classmethod
+    def add_many(cls, rows: List[dict]):
+        """Запись отпечатков: одна строка на пару (sha256, bot_id).
+
+        Повторная публикация заменяет прежнюю строку; file_id прежней
+        сохраняется, если у новой его нет.
+        """
+        latest = {(row["sha256"], row["bot_id"]): row for row in rows}
+        if not latest:
+            return
+        with session_factory() as session:
+            existing = session.execute(
+                select(cls.model)
+                .where(cls.model.sha256.in_({sha256 for sha256, _ in latest}))
+                .order_by(cls.model.published_at.desc())
+            ).scalars()
+            stale = []
+            for row in existing:
+                key = (row.sha256, row.bot_id)
+                if key not in latest:
+                    continue
+                stale.append(row.id)
+                # Строки идут от новых к старым: берём самый свежий file_id
+                if row.file_id and not latest[key].get("file_id"):
+                    latest[key] = {**latest[key], "file_id": row.file_id}
+            if stale:
+                session.execute(delete(cls.model).where(cls.model.id.in_(stale)))
+            session.execute(insert(cls.model), list(latest.values()))
+            session.commit()
+
+
 if __name__ == "__main__":
     create_tables()
 
@@ -0,0 +1,100 @@
+import asyncio
+import random
+import time
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from settings import Settings, get_settings
+
+cfg: Settings = get_settings()
+
+# Классы ошибок публикации
+RATE_LIMITED = "rate_limited"
+TRANSIENT = "transient"
+PERMISSION = "permission"
+PERMANENT = "permanent"
+
+RETRYABLE = (RATE_LIMITED, TRANSIENT)
+
+
+def classify(error: Exception) -> Tuple[str, Optional[float]]:
+    """Класс ошибки и пауза, которую просит Telegram (для 429)"""
+    import aiogram.exceptions
+
+    if isinstance(error, aiogram.exceptions.TelegramRetryAfter):
+        return RATE_LIMITED, float(error.retry_after)
+    if isinstance(
+        error,
+        (
+            aiogram.exceptions.TelegramNetworkError,
+            aiogram.exceptions.TelegramServerError,
+            aiogram.exceptions.RestartingTelegram,
+            asyncio.TimeoutError,
+            ConnectionError,
+        ),
+    ):
+        return TRANSIENT, None
+    if isinstance(
+        error,
+        (
+            aiogram.exceptions.TelegramForbiddenError,
+            aiogram.exceptions.TelegramUnauthorizedError,
+        ),
+    ):
+        return PERMISSION, None
+    return PERMANENT, None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Экспоненциальная пауза с полным джиттером; 429 ждём сколько сказано"""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 1)
+    ceiling = min(cfg.retry_max_seconds, cfg.retry_base_seconds * 2**attempt)
+    return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """Размыкатель на канал: после N ошибок подряд канал отдыхает cooldown.
+
+    По истечении паузы пропускается одна пробная публикация (half-open):
+    успех замыкает цепь, ошибка размыкает её снова.
+    """
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.errors: Dict[int, int] = {}
+        self.opened_at: Dict[int, float] = {}
+
+    def allow(self, key: int) -> bool:
+        opened_at = self.opened_at.get(key)
+        if opened_at is None:
+            return True
+        if time.monotonic() - opened_at < self.cooldown:
+            return False
+        # half-open: пробный тик, до его результата остальные ждут
+        self.opened_at[key] = time.monotonic()
+        return True
+
+    def success(self, key: int):
+        self.errors.pop(key, None)
+        if self.opened_at.pop(key, None) is not None:
+            logger.info(f"Circuit for channel {key} closed")
+
+    def failure(self, key: int):
+        self.errors[key] = self.errors.get(key, 0) + 1
+        if self.errors[key] >= self.failures:
+            if key not in self.opened_at:
+                logger.warning(
+                    f"Circuit for channel {key} opened after "
+                    f"{self.errors[key]} failures"
+                )
+            self.opened_at[key] = time.monotonic()
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            key: max(self.cooldown - (now - opened_at), 0)
+            for key, opened_at in self.opened_at.items()
+        }
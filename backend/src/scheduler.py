@@ -1,21 +1,103 @@
+import asyncio
 import os
-import shutil
-from typing import Dict, List
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, List, Optional
 
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from loguru import logger
-from PIL import Image
 
-from bot import CustomBot, FSInputFile, InputMediaPhoto
+from archive import DoneArchiver
+from bot_pool import assign_bots, bot_tokens, primary_bot_id, resolve_bot_id
 from channels_files import ChannelBroken, ChannelNotFound, ChannelsFileManager
+from heap_scheduler import CronWindow, HeapScheduler
 from models import ChannelORM
-from repository import ChannelRepository
+from permissions import permission_checker
+from pipeline import PublishPipeline
+from profiler import profiling
+from repository import ChannelRepository, LeaseRepository
 from settings import Settings, get_settings
+from startup import verify_channels
 
 scheduler = AsyncIOScheduler()
+# Движок для очень большого числа каналов (scheduler_engine = "heap")
+heap_scheduler = HeapScheduler()
+# Конвейер публикации создаётся в работающем цикле событий при первом тике
+pipeline: Optional[PublishPipeline] = None
 cfg: Settings = get_settings()
 
+# Идентификатор процесса для аренды задач (несколько воркеров / реплик)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+ARCHIVE_LEASE = "archive"
+
+
+# Какие каналы обслуживает этот процесс: в режиме workers API не постит,
+# а каждый шард worker.py ставит свой фильтр по кольцу
+owns_channel: Callable[[ChannelORM], bool] = (
+    lambda channel: cfg.posting_mode != "workers"
+)
+
+
+def set_channel_filter(predicate: Callable[[ChannelORM], bool]):
+    global owns_channel
+    owns_channel = predicate
+
+
+def posting_jobs() -> AsyncIOScheduler | HeapScheduler:
+    """Движок, в котором живут задачи постинга"""
+    if cfg.scheduler_engine == "heap":
+        return heap_scheduler
+    return scheduler
+
+
+def start_scheduler():
+    scheduler.start()
+    if cfg.scheduler_engine == "heap":
+        heap_scheduler.start()
+
+
+async def stop_scheduler():
+    global pipeline
+    if scheduler.running:
+        scheduler.shutdown()
+    if cfg.scheduler_engine == "heap":
+        heap_scheduler.shutdown()
+    if pipeline is not None:
+        await pipeline.stop()
+        pipeline = None
+    await permission_checker.close()
+    release_leases()
+
+
+def get_pipeline() -> PublishPipeline:
+    global pipeline
+    if pipeline is None:
+        pipeline = PublishPipeline(
+            on_drained=deactivate_channel,
+            on_channel_error=handle_channel_error,
+            owns_channel=channel_owned,
+        )
+        pipeline.start()
+    return pipeline
+
+
+def channel_lease(channel_id: int | str) -> str:
+    return f"channel:{channel_id}"
+
+
+def channel_owned(channel: ChannelORM) -> bool:
+    """Канал всё ещё включён и его аренда за этим воркером"""
+    current = ChannelRepository.get(channel.id)
+    return (
+        current is not None
+        and current.active
+        and LeaseRepository.holds(channel_lease(channel.id), WORKER_ID)
+    )
+
 
 async def add_tasks():
     """Добавление задач для всех активных каналов"""
@@ -24,273 +106,279 @@ async def add_tasks():
     if not active_channels:
         logger.info("No active channels found.")
 
-    for channel in active_channels:
-        add_posting_task(channel)
+    channels = [channel for channel in active_channels if owns_channel(channel)]
+    if cfg.startup_verify_channels:
+        await asyncio.to_thread(verify_channels, channels)
 
+    # Аренды всех каналов захватываются пачками, а не запросом на канал
+    acquired = await asyncio.to_thread(
+        LeaseRepository.acquire_many,
+        [channel_lease(channel.id) for channel in channels],
+        WORKER_ID,
+        cfg.lease_ttl_seconds,
+    )
+    leased = []
+    for channel in channels:
+        if channel_lease(channel.id) in acquired:
+            leased.append(channel)
+        else:
+            logger.info(f"Channel {channel.name} is owned by another worker")
+
+    # Ботов назначаем только своим каналам
+    await assign_channel_bots(leased)
+    for channel in leased:
+        schedule_posting_job(channel)
+
+    add_archive_task()
+    add_heartbeat_task()
+    add_permissions_task()
+
+
+async def assign_channel_bots(channels: List[ChannelORM]):
+    """Назначает ботов каналам без бота: основной или проверенный бот пула"""
+    await verify_pool_bots(channels)
+    await asyncio.to_thread(save_channel_bots, channels)
+
+
+async def verify_pool_bots(channels: List[ChannelORM]):
+    """Проверяет права остальных ботов пула в каналах без назначения.
+
+    Без проверки assign_bots выбирает только основного бота; результаты
+    ложатся в кэш permission_checker, откуда их и берёт назначение.
+    """
+    pool = bot_tokens()
+    chat_ids = [channel.chat_id for channel in channels if channel.bot_id not in pool]
+    others = [bot_id for bot_id in pool if bot_id != primary_bot_id()]
+    if not chat_ids or not others:
+        return
+
+    await asyncio.gather(
+        *(
+            permission_checker.check_many(
+                chat_ids, bot_ids=dict.fromkeys(chat_ids, bot_id)
+            )
+            for bot_id in others
+        )
+    )
 
-def add_posting_task(channel: ChannelORM):
-    """Добавление задачи на постинг для конкретного канала"""
-    logger.info(f"Adding posting task for channel {channel.name} (ID: {channel.id})")
+
+def save_channel_bots(channels: List[ChannelORM]):
+    changed = assign_bots(
+        channels,
+        ChannelRepository.bot_loads(),
+        lambda chat_id, bot_id: permission_checker.cached(chat_id, bot_id) is True,
+    )
+    for channel in changed:
+        # Только bot_id: остальные поля мог поменять параллельный запрос
+        ChannelRepository.set_bot_id(channel.id, channel.bot_id)
+
+
+def add_permissions_task():
+    """Добавление задачи обновления кэша прав бота в каналах"""
+    logger.info("Adding permissions refresh task")
 
     scheduler.add_job(
-        posting,
-        trigger=IntervalTrigger(minutes=channel.interval),
-        id=str(channel.id),
-        name=channel.name,
-        args=[channel],
+        refresh_permissions,
+        trigger=IntervalTrigger(seconds=max(cfg.permission_cache_ttl // 2, 1)),
+        id="permissions",
+        name="permissions",
         replace_existing=True,
+        next_run_time=datetime.now(),
     )
 
 
-async def posting(channel: ChannelORM):
-    """Функция, которая выполняет постинг для конкретного канала"""
-    logger.info(f"Start posting process for channel {channel.name} (ID: {channel.id})")
+async def refresh_permissions():
+    """Пакетная проверка прав во всех каналах, которые постит этот процесс"""
+    bot_ids = {
+        job.args[0].chat_id: resolve_bot_id(job.args[0])
+        for job in posting_jobs().get_jobs()
+        if job.id.isdigit() and job.args
+    }
+    if not bot_ids:
+        return
 
-    filemanager = ChannelsFileManager(base_dir=cfg.base_dir)
+    results = await permission_checker.check_many(bot_ids, force=True, bot_ids=bot_ids)
+    denied = [chat_id for chat_id, allowed in results.items() if allowed is False]
+    if denied:
+        logger.warning(f"Bot can't post to {len(denied)} channels: {denied}")
 
-    try:
-        files = filemanager.get_channel_by_name(channel.name)
-        source_files = files[channel.name]["source"]
-
-        if not source_files:
-            logger.info(f"No source files to post for channel {channel.name}")
-            deactivate_channel(channel)
-            return
-
-        source_files.sort()  # Сортировка по имени файлов
-
-        # Группируем файлы по номеру
-        file_groups = group_files_by_number(source_files)
-        for file_number, file_group in file_groups.items():
-            try:
-                txt_files, jpg_files = separate_files_by_type(file_group)
-
-                # Публикуем только если есть хотя бы один .txt файл
-                if not txt_files:
-                    logger.warning(
-                        f"No .txt file found for {file_number} in channel {channel.name}"
-                    )
-                    publication_files = prepare_publication_files(txt_files, jpg_files)
-                    await publish_files(channel, publication_files)
-                    logger.info(
-                        f"Successfully published {file_number} in channel {channel.name}"
-                    )
-                    if len(file_groups.keys()) == 1:
-                        channel.active = False
-                        ChannelRepository.update(channel)
-                        deactivate_channel(channel)
-                    break
-
-                # Публикуем комплект файлов
-                publication_files = prepare_publication_files(txt_files, jpg_files)
-                await publish_files(channel, publication_files)
-
-                logger.info(
-                    f"Successfully published {file_number} in channel {channel.name}"
-                )
-                if len(file_groups.keys()) == 1:
-                    channel.active = False
-                    ChannelRepository.update(channel)
-                    deactivate_channel(channel)
-                break
-
-            except Exception as e:
-                logger.error(
-                    f"Error processing file group {file_number} in channel {channel.name}: {e}"
-                )
-
-    except ChannelNotFound as e:
-        handle_channel_not_found(channel, e)
-
-    except ChannelBroken as e:
-        await handle_channel_broken(channel, e)
-
-    except Exception as e:
-        logger.error(f"Unexpected error in posting for channel {channel.name}: {e}")
-
-
-def group_files_by_number(files: List[str]) -> Dict[str, List[str]]:
-    """Группируем файлы по числовому идентификатору (например, 0001, 0035)"""
-    file_groups = {}
-
-    for file in files:
-        # Извлекаем базовый номер (до подчеркивания или точки)
-        base_number = file.split(".")[0].split("_")[0]
-
-        if base_number not in file_groups:
-            file_groups[base_number] = []
-
-        file_groups[base_number].append(file)
-
-    logger.debug(f"Grouped files: {file_groups}")
-    return file_groups
-
-
-def separate_files_by_type(file_group: List[str]) -> (List[str], List[str]):
-    """Разделяем файлы на текстовые (.txt) и изображения (.jpg)"""
-    txt_files = [f for f in file_group if f.endswith(".txt")]
-    jpg_files = [f for f in file_group if f.endswith(".jpg")]
-
-    logger.debug(
-        f"Separated files: {len(txt_files)} .txt files, {len(jpg_files)} .jpg files"
+
+def add_heartbeat_task():
+    """Добавление задачи продления аренд и подхвата каналов упавших воркеров"""
+    logger.info(f"Adding lease heartbeat task for worker {WORKER_ID}")
+
+    scheduler.add_job(
+        heartbeat,
+        trigger=IntervalTrigger(seconds=max(cfg.lease_ttl_seconds // 3, 1)),
+        id="heartbeat",
+        name="heartbeat",
+        replace_existing=True,
     )
-    return txt_files, jpg_files
 
 
-def prepare_publication_files(txt_files: List[str], jpg_files: List[str]) -> List[str]:
-    """Подготовка списка файлов для публикации (ограничиваем до 3 изображений)"""
-    # Сортируем jpg файлы по имени и берем только первые 3
-    jpg_files.sort()
-    jpg_files = jpg_files[:3]
+async def heartbeat():
+    to_schedule = await asyncio.to_thread(sync_leases)
+    if not to_schedule:
+        return
+    await assign_channel_bots(to_schedule)
+    for channel in to_schedule:
+        schedule_posting_job(channel)
 
-    # Формируем список для публикации (1 txt + до 3 jpg)
-    publication_files = txt_files + jpg_files
-    logger.debug(f"Prepared publication files: {publication_files}")
-    return publication_files
 
+def sync_leases() -> List[ChannelORM]:
+    """Продлевает свои аренды, отпускает потерянные и захватывает свободные.
 
-async def publish_files(channel: ChannelORM, files: List[str]):
-    """Логика публикации файлов в канал"""
-    logger.info(f"Publishing files {files} to channel {channel.name}")
+    Возвращает каналы, которым нужна задача постинга.
+    """
+    owned = LeaseRepository.renew(WORKER_ID, cfg.lease_ttl_seconds)
 
-    bot = CustomBot()
-    try:
-        # Открываем текстовый файл для публикации
-        txt_file = next((f for f in files if f.endswith(".txt")), None)
-        if txt_file:
-            txt_path = os.path.join(cfg.base_dir, channel.name, "source", txt_file)
-            with open(txt_path, "r") as f:
-                text = f.read()
+    # Аренду перехватил другой воркер или канал выключили - задачу снимаем
+    for job in posting_jobs().get_jobs():
+        if job.id.isdigit() and channel_lease(job.id) not in owned:
+            logger.warning(f"Lease for channel {job.name} lost, removing job")
+            remove_job(job.id)
 
-            # Если есть изображения, добавляем их
-            jpg_files = [f for f in files if f.endswith(".jpg")]
-            media = []
+    channels = [c for c in ChannelRepository.get_actives() if owns_channel(c)]
+    active_leases = {channel_lease(channel.id) for channel in channels}
 
-            for file in jpg_files:
-                file_path = os.path.join(cfg.base_dir, channel.name, "source", file)
+    # Живые аренды других воркеров не трогаем: одним запросом выбираем
+    # свободные и просроченные и захватываем их пачкой
+    free = LeaseRepository.available(sorted(active_leases - owned))
+    taken = (
+        LeaseRepository.acquire_many(free, WORKER_ID, cfg.lease_ttl_seconds)
+        if free
+        else set()
+    )
 
-                # Если размер изображения больше 5 МБ, уменьшаем его
-                if os.path.getsize(file_path) > 5 * 1024 * 1024:  # больше 5 МБ
-                    file_path = await compress_image(file_path)  # уменьшаем изображение
+    to_schedule = []
+    for channel in channels:
+        lease = channel_lease(channel.id)
+        if lease in taken:
+            logger.info(f"Took over channel {channel.name} (ID: {channel.id})")
+            to_schedule.append(channel)
+        elif lease in owned and posting_jobs().get_job(str(channel.id)) is None:
+            to_schedule.append(channel)
 
-                media.append(
-                    InputMediaPhoto(media=FSInputFile(file_path), caption=text)
-                )
+    # Канал выключен или переехал в другой шард
+    for lease in owned - active_leases - {ARCHIVE_LEASE}:
+        remove_job(lease.split(":", 1)[1])
+        LeaseRepository.release(lease, WORKER_ID)
+    return to_schedule
 
-            if media:
-                await bot.send_post(channel.chat_id, media=media)
-            else:
-                await bot.send_message(
-                    channel.chat_id, text=text, parse_mode=channel.parse_mode
-                )
 
-            # Закрываем сессию после отправки
-            await bot.session.close()
+def release_leases():
+    """Освобождает все аренды процесса при остановке"""
+    LeaseRepository.release_all(WORKER_ID)
+    logger.info(f"Leases of worker {WORKER_ID} released")
 
-            # Если публикация прошла успешно, перемещаем файлы в папку done
-            move_files_to_done(channel, files)
 
-            logger.info(f"Successfully published message for {channel.name}")
+def add_archive_task():
+    """Добавление фоновой задачи архивации папок done"""
+    logger.info("Adding archive task")
 
-        else:
-            logger.warning(f"No .txt file found for channel {channel.name}")
-
-            jpg_files = [f for f in files if f.endswith(".jpg")]
-            media = []
-
-            for file in jpg_files:
-                file_path = os.path.join(cfg.base_dir, channel.name, "source", file)
-
-                # Если размер изображения больше 5 МБ, уменьшаем его
-                if os.path.getsize(file_path) > 5 * 1024 * 1024:  # больше 5 МБ
-                    file_path = await compress_image(file_path)  # уменьшаем изображение
-
-                media.append(InputMediaPhoto(media=FSInputFile(file_path)))
-
-            if media:
-                await bot.send_post(channel.chat_id, media=media)
-                move_files_to_done(channel, files)
-            else:
-                move_files_to_except(channel, files)
-
-    except Exception as e:
-        logger.error(f"Failed to publish files for {channel.name}: {e}")
-        # В случае ошибки, перемещаем файлы в папку except
-        move_files_to_except(channel, files)
-
-    finally:
-        # Закрываем сессию бота в любом случае
-        await bot.session.close()
-
-
-async def compress_image(file_path: str) -> str:
-    """Сжимаем изображение, если его размер больше 5 МБ"""
-    logger.info(f"Compressing image: {file_path}")
-
-    # Открываем изображение
-    with Image.open(file_path) as img:
-        # Сохраняем оригинальные параметры изображения
-        original_width, original_height = img.size
-        logger.info(f"Original image size: {original_width}x{original_height}")
-
-        # Понижаем качество изображения, если оно слишком большое
-        new_file_path = file_path.replace("source", "temp")
-        if img.mode in (
-            "RGBA",
-            "P",
-        ):  # Преобразуем изображения в RGB, если они с альфа-каналом
-            img = img.convert("RGB")
-
-        # Уменьшаем размер изображения пропорционально
-        max_size = (1920, 1920)  # Устанавливаем максимальные размеры
-        img.thumbnail(max_size, Image.ANTIALIAS)
-
-        # Сохраняем изображение с качеством 85% для уменьшения размера файла
-        img.save(new_file_path, format="JPEG", quality=85)
-
-        # Проверяем размер файла, если он меньше 5 MB, оставляем его, иначе пробуем еще раз с меньшим качеством
-        while os.path.getsize(new_file_path) > 5 * 1024 * 1024:  # Если больше 5 МБ
-            quality = 75
-            img.save(new_file_path, format="JPEG", quality=quality)
-            quality -= 5
-            if quality < 50:
-                logger.warning(f"Unable to compress {file_path} under 5MB")
-                break
-
-        logger.info(
-            f"Compressed image saved to: {new_file_path}, new size: {os.path.getsize(new_file_path) / 1024 / 1024:.2f} MB"
+    scheduler.add_job(
+        archive_done,
+        trigger=IntervalTrigger(minutes=cfg.archive_interval_minutes),
+        id="archive",
+        name="archive",
+        replace_existing=True,
+    )
+
+
+async def archive_done():
+    """Упаковка старых опубликованных постов в бандлы"""
+    # Архивирует только один воркер, иначе бандлы будут писаться параллельно
+    if not LeaseRepository.acquire(ARCHIVE_LEASE, WORKER_ID, cfg.lease_ttl_seconds):
+        return
+
+    archiver = DoneArchiver(base_dir=cfg.base_dir)
+    await asyncio.to_thread(archiver.run)
+
+
+async def add_posting_task(channel: ChannelORM) -> bool:
+    """Добавление задачи на постинг; False - канал обслуживает другой воркер"""
+    if not owns_channel(channel):
+        logger.info(f"Channel {channel.name} is served by another posting worker")
+        return False
+
+    lease = channel_lease(channel.id)
+    if not LeaseRepository.acquire(lease, WORKER_ID, cfg.lease_ttl_seconds):
+        logger.info(f"Channel {channel.name} is owned by another worker")
+        return False
+
+    await assign_channel_bots([channel])
+    schedule_posting_job(channel)
+    return True
+
+
+def schedule_posting_job(channel: ChannelORM):
+    logger.info(f"Adding posting task for channel {channel.name} (ID: {channel.id})")
+
+    if cfg.scheduler_engine == "heap":
+        heap_scheduler.add_job(
+            leased_posting,
+            interval=channel.interval * 60,
+            id=str(channel.id),
+            name=channel.name,
+            args=[channel],
+            window=channel.posting_window,
         )
-        return new_file_path
+        return
 
+    scheduler.add_job(
+        leased_posting,
+        trigger=IntervalTrigger(minutes=channel.interval),
+        id=str(channel.id),
+        name=channel.name,
+        args=[channel],
+        replace_existing=True,
+    )
+
+
+async def leased_posting(channel: ChannelORM):
+    """Постинг по расписанию только пока аренда канала за этим воркером"""
+    if not LeaseRepository.holds(channel_lease(channel.id), WORKER_ID):
+        logger.warning(f"Lease for channel {channel.name} lost, skipping tick")
+        remove_job(str(channel.id))
+        return
 
-def move_files_to_done(channel: ChannelORM, files: List[str]):
-    """Перемещаем файлы в папку done"""
-    logger.info(f"Moving files to 'done' for channel {channel.name}")
+    # Heap-движок сам переносит запуск в окно, с APScheduler переносим здесь
+    if cfg.scheduler_engine != "heap" and defer_to_window(channel):
+        return
 
-    for file in files:
-        source_path = os.path.join(cfg.base_dir, channel.name, "source", file)
-        done_path = os.path.join(cfg.base_dir, channel.name, "done", file)
+    # Бот потерял права - не тратим время на сжатие и загрузку файлов
+    if permission_checker.cached(channel.chat_id, resolve_bot_id(channel)) is False:
+        logger.warning(f"Bot can't post to channel {channel.name}, skipping tick")
+        return
 
-        try:
-            shutil.move(source_path, done_path)
-            logger.info(f"File {file} moved to 'done' for channel {channel.name}")
-        except Exception as e:
-            logger.error(f"Failed to move file {file} to 'done': {e}")
+    await posting(channel)
 
 
-def move_files_to_except(channel: ChannelORM, files: List[str]):
-    """Перемещаем файлы в папку except"""
-    logger.info(f"Moving files to 'except' for channel {channel.name}")
+def defer_to_window(channel: ChannelORM) -> bool:
+    """Тик вне окна публикации переносится на ближайшую минуту окна"""
+    if not channel.posting_window:
+        return False
+    now = time.time()
+    next_fire = CronWindow(channel.posting_window).next_fire(now)
+    if next_fire <= now:
+        return False
+
+    run_date = datetime.fromtimestamp(next_fire).astimezone()
+    logger.info(
+        f"Channel {channel.name} is outside its posting window until {run_date}"
+    )
+    try:
+        # Интервал дальше отсчитывается от перенесённого запуска, как в heap
+        scheduler.modify_job(str(channel.id), next_run_time=run_date)
+    except JobLookupError:
+        logger.debug(f"Job {channel.id} is not scheduled in this worker")
+    return True
 
-    for file in files:
-        source_path = os.path.join(cfg.base_dir, channel.name, "source", file)
-        except_path = os.path.join(cfg.base_dir, channel.name, "except", file)
 
-        try:
-            shutil.move(source_path, except_path)
-            logger.info(f"File {file} moved to 'except' for channel {channel.name}")
-        except Exception as e:
-            logger.error(f"Failed to move file {file} to 'except': {e}")
+async def posting(channel: ChannelORM):
+    """Функция, которая выполняет постинг для конкретного канала"""
+    async with profiling.posting(channel.name):
+        await get_pipeline().submit(channel)
 
 
 def deactivate_channel(channel: ChannelORM):
@@ -298,7 +386,30 @@ def deactivate_channel(channel: ChannelORM):
     logger.info(f"Deactivating channel {channel.name} (ID: {channel.id})")
     channel.active = False
     ChannelRepository.update(channel)
-    scheduler.remove_job(str(channel.id))
+    remove_job(str(channel.id))
+    LeaseRepository.release(channel_lease(channel.id))
+
+
+def remove_job(job_id: str):
+    """Снятие задачи, подготовленных постов и повторов канала в этом процессе"""
+    try:
+        posting_jobs().remove_job(job_id)
+    except (JobLookupError, KeyError):
+        logger.debug(f"Job {job_id} is not scheduled in this worker")
+    if pipeline is not None and job_id.isdigit():
+        pipeline.drop(int(job_id))
+
+
+async def handle_channel_error(channel: ChannelORM, exception: Exception):
+    """Обработка ошибок чтения папки канала на стадии scan"""
+    if isinstance(exception, ChannelNotFound):
+        handle_channel_not_found(channel, exception)
+    elif isinstance(exception, ChannelBroken):
+        await handle_channel_broken(channel, exception)
+    else:
+        logger.error(
+            f"Unexpected error in posting for channel {channel.name}: {exception}"
+        )
 
 
 def handle_channel_not_found(channel: ChannelORM, exception: ChannelNotFound):
@@ -306,7 +417,6 @@ def handle_channel_not_found(channel: ChannelORM, exception: ChannelNotFound):
     logger.error(f"Channel {channel.name} not found: {exception}")
     filemanager = ChannelsFileManager(base_dir=cfg.base_dir)
     filemanager.create_channel(channel.name)
-    scheduler.remove_job(str(channel.id))
     deactivate_channel(channel)
 
 
@@ -314,5 +424,5 @@ async def handle_channel_broken(channel: ChannelORM, exception: ChannelBroken):
     """Обработка ошибки: канал поврежден"""
     logger.warning(f"Channel {channel.name} is broken: {exception}")
     filemanager = ChannelsFileManager(base_dir=cfg.base_dir)
-    filemanager.fix_channel(channel.name)
-    await posting(channel)  # Попробуем снова выполнить постинг
+    # Восстанавливаем все недостающие подкаталоги, пост уйдёт на следующем тике
+    await asyncio.to_thread(filemanager.fix_channel, channel.name)
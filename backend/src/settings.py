@@ -1,7 +1,7 @@
 import logging
 import os
 from functools import lru_cache
-from typing import final
+from typing import List, Optional, final
 
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -19,11 +19,79 @@ class Settings(BaseSettings):
 
     debug: bool = True
     bot_token: str = None
+    # Дополнительные токены пула ботов, JSON-список: BOT_TOKENS='["1:a", "2:b"]'
+    bot_tokens: List[str] = []
+    # Свой Bot API сервер (локальный telegram-bot-api или фейк для бенчмарков)
+    bot_api_url: Optional[str] = None
 
+    database_url: str = "sqlite:///../database/db.db"
     database_path: str = "/"
     base_dir: str = "/"
     logs_path: str = "/logs"
 
+    archive_after_hours: int = 24 * 7
+    archive_retention_days: int = 90
+    archive_interval_minutes: int = 60
+    archive_bundle_max_mb: int = 256
+
+    lease_ttl_seconds: int = 30
+
+    # api - постинг в процессе API, workers - отдельно через worker.py
+    posting_mode: str = "api"
+    worker_processes: int = 2
+    # apscheduler - задача на канал, heap - один таймер на все каналы
+    scheduler_engine: str = "apscheduler"
+
+    # Конвейер публикации: размер очередей между стадиями и число обработчиков
+    pipeline_queue_size: int = 100
+    pipeline_scan_workers: int = 4
+    pipeline_prepare_workers: int = 2
+    pipeline_send_workers: int = 4
+    pipeline_finalize_workers: int = 2
+    send_rate_per_second: float = 20
+
+    profile_interval_ms: float = 5
+
+    # Повторы отправки и размыкатель на канал
+    retry_max_attempts: int = 5
+    retry_base_seconds: float = 2
+    retry_max_seconds: float = 300
+    breaker_failures: int = 5
+    breaker_cooldown_seconds: float = 300
+
+    # Индекс отпечатков опубликованного для политик дубликатов каналов
+    fingerprint_enabled: bool = True
+
+    # Публикация медиа: лимит загрузки 50 МБ у облачного Bot API,
+    # до 2000 МБ у локального сервера (bot_api_url)
+    max_media_per_post: int = 3
+    max_upload_mb: int = 50
+    upload_chunk_size: int = 256 * 1024
+    video_workers: int = 1
+    video_min_bitrate_kbps: int = 500
+
+    # Подготовка следующих постов канала заранее, между тиками (0 - выкл.)
+    prefetch_depth: int = 2
+    prefetch_workers: int = 1
+
+    # Проверка прав бота в каналах (getChatMember)
+    permission_cache_ttl: int = 600
+    permission_check_concurrency: int = 10
+    permission_check_rate: float = 20
+    permission_check_batch_max: int = 1000
+
+    # Проверка структуры каталогов активных каналов при старте
+    startup_verify_channels: bool = True
+    startup_workers: int = 32
+
+    # Постраничный просмотр файлов канала (/channels/files)
+    files_page_max: int = 1000
+
+    # Сжатие ответов API (brotli - если установлен пакет brotli)
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
     username: str = "ADMIN"
     password: str = ""
 
@@ -0,0 +1,37 @@
+import bisect
+import hashlib
+from typing import Iterable, List, Tuple
+
+
+class HashRing:
+    """Консистентное хеширование каналов по шардам.
+
+    Каждый узел занимает `replicas` виртуальных точек на кольце, поэтому
+    при добавлении/удалении узла переезжает только ~1/N каналов.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 100):
+        self.replicas = replicas
+        self._ring: List[Tuple[int, str]] = []
+        self._keys: List[int] = []
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+    def add_node(self, node: str):
+        for i in range(self.replicas):
+            bisect.insort(self._ring, (self._hash(f"{node}#{i}"), node))
+        self._keys = [point for point, _ in self._ring]
+
+    def remove_node(self, node: str):
+        self._ring = [(point, n) for point, n in self._ring if n != node]
+        self._keys = [point for point, _ in self._ring]
+
+    def get_node(self, key: str) -> str:
+        if not self._ring:
+            raise ValueError("Hash ring is empty")
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
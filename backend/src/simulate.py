@@ -0,0 +1,272 @@
+"""Симуляция расписания на виртуальных часах.
+
+Настоящие add_tasks/posting и конвейер публикации работают поверх
+виртуального времени, индекса файлов в памяти и бота-заглушки, поэтому
+неделя расписания тысяч каналов проигрывается за секунды.
+
+Запуск из backend/src:
+    python simulate.py --channels 1000 --groups 50 --intervals 60 240 \\
+        --horizon-hours 168 --window "* 9-21 * * *" --output sim.json
+"""
+
+import argparse
+import asyncio
+import bisect
+import functools
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+
+def configure_environment(workdir: str):
+    """Настройки задаются до импорта модулей бэкенда: они читают cfg при импорте"""
+    os.environ.update(
+        {
+            "DEBUG": "false",
+            "BOT_TOKEN": os.environ.get("BOT_TOKEN", "123456:simulation"),
+            "BASE_DIR": workdir,
+            "LOGS_PATH": workdir,
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'simulation.db')}",
+            "SCHEDULER_ENGINE": "heap",
+            "POSTING_MODE": "api",
+            # Каналы живут в памяти: проверка доступа к ним при старте не нужна
+            "STARTUP_VERIFY_CHANNELS": "false",
+            # Частоту отправки меряем в виртуальном времени, а не ограничиваем
+            "SEND_RATE_PER_SECOND": "0",
+            # Аренды живут в реальном времени и не должны истечь посреди прогона
+            "LEASE_TTL_SECONDS": str(10**9),
+        }
+    )
+
+
+@functools.lru_cache()
+def sample_jpeg() -> bytes:
+    """Маленький JPEG для отпечатков файлов, которых нет на диске"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), "gray").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class VirtualClock:
+    def __init__(self, start: float):
+        self.start = start
+        self.current = start
+
+    def now(self) -> float:
+        return self.current
+
+    def elapsed(self) -> float:
+        return self.current - self.start
+
+
+class SimBot:
+    """Бот-заглушка: записывает отправки в таймлайн по виртуальному времени"""
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.timeline: List[dict] = []
+
+    async def send_post(self, channel_id, media):
+        self._record(channel_id, len(media))
+        return True
+
+    async def send_message(self, channel_id, text, parse_mode=None):
+        self._record(channel_id, 0)
+        return True
+
+    def _record(self, channel_id, media: int):
+        self.timeline.append(
+            {"t": self.clock.elapsed(), "chat_id": channel_id, "media": media}
+        )
+
+
+def peak_rate(times: List[float], window: float) -> int:
+    """Максимум отправок в любом скользящем окне длиной window секунд"""
+    peak = 0
+    for i, t in enumerate(times):
+        peak = max(peak, bisect.bisect_right(times, t + window - 1e-9) - i)
+    return peak
+
+
+async def simulate(args) -> dict:
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    import scheduler
+    from channels_files import ChannelNotFound, ChannelsFileManager
+    from database import create_tables
+    from models import ChannelORM
+    from repository import ChannelRepository
+
+    class MemoryFileManager(ChannelsFileManager):
+        """Индекс файлов каналов в памяти вместо диска"""
+
+        def __init__(self):
+            self.base_dir = "memory://"
+            self.dirs: Dict[str, Dict[str, set]] = {}
+
+        def add_channel(self, name: str, groups: int, images: int):
+            source = set()
+            for g in range(groups):
+                source.add(f"{g:04d}.txt")
+                source.update(f"{g:04d}_{i + 1}.jpg" for i in range(images))
+            self.dirs[name] = {"source": source, "done": set(), "except": set()}
+
+        def get_channel_by_name(self, name):
+            if name not in self.dirs:
+                raise ChannelNotFound(f"Channel {name} not found")
+            return {name: {d: list(files) for d, files in self.dirs[name].items()}}
+
+        def file_path(self, channel_name, subdir, file):
+            return f"/memory/{channel_name}/{subdir}/{file}"
+
+        def file_size(self, channel_name, subdir, file):
+            return args.image_kb * 1024
+
+        def read_text(self, channel_name, subdir, file):
+            return f"Post {file} of {channel_name}"
+
+        def file_stat(self, channel_name, subdir, file):
+            if file not in self.dirs[channel_name][subdir]:
+                raise FileNotFoundError(file)
+            size = self.file_size(channel_name, subdir, file)
+            return os.stat_result((0o100644, 0, 0, 1, 0, 0, size, 0, 0, 0))
+
+        def open_file(self, channel_name, subdir, file):
+            return io.BytesIO(sample_jpeg())
+
+        def move_files(self, channel_name, files, src, dst):
+            self.dirs[channel_name][src].difference_update(files)
+            self.dirs[channel_name][dst].update(files)
+            return []
+
+    create_tables()
+
+    clock = VirtualClock(args.start or time.time())
+    scheduler.heap_scheduler.clock = clock.now
+
+    filemanager = MemoryFileManager()
+    rng = random.Random(args.seed)
+    names: Dict[int, str] = {}
+    for c in range(args.channels):
+        name = f"sim_{c:05d}"
+        filemanager.add_channel(name, args.groups, args.images)
+        channel = ChannelORM(
+            name=name,
+            chat_id=c + 1,
+            interval=rng.choice(args.intervals),
+            parse_mode="html",
+            posting_window=args.window,
+            active=True,
+            path_to_source_dir=f"/memory/{name}/source",
+            path_to_done_dir=f"/memory/{name}/done",
+            path_to_except_dir=f"/memory/{name}/except",
+        )
+        ChannelRepository.add(channel)
+        names[c + 1] = name
+
+    pipeline = scheduler.get_pipeline()
+    pipeline.filemanager = filemanager
+    bot = SimBot(clock)
+    pipeline.bot = bot
+
+    drained_at: Dict[str, Optional[float]] = {name: None for name in names.values()}
+    deactivate = pipeline.on_drained
+
+    def on_drained(channel: ChannelORM):
+        drained_at[channel.name] = clock.elapsed()
+        deactivate(channel)
+
+    pipeline.on_drained = on_drained
+
+    await scheduler.add_tasks()
+
+    horizon = clock.start + args.horizon_hours * 60 * 60
+    wall_started = time.perf_counter()
+    ticks = 0
+    while True:
+        next_run = scheduler.heap_scheduler.next_run()
+        if next_run is None or next_run > horizon:
+            break
+        clock.current = next_run
+        tasks = scheduler.heap_scheduler.run_due(next_run)
+        await asyncio.gather(*tasks)
+        ticks += len(tasks)
+
+    wall_elapsed = time.perf_counter() - wall_started
+    pipeline.bot = None
+    await scheduler.stop_scheduler()
+
+    send_times = sorted(event["t"] for event in bot.timeline)
+    drain_times = [t for t in drained_at.values() if t is not None]
+    for event in bot.timeline:
+        event["channel"] = names.get(event.pop("chat_id"))
+
+    if args.timeline:
+        with open(args.timeline, "w") as f:
+            json.dump(bot.timeline, f)
+
+    return {
+        "params": vars(args),
+        "simulated_hours": clock.elapsed() / 3600,
+        "wall_s": wall_elapsed,
+        "ticks": ticks,
+        "posts": len(bot.timeline),
+        "channels_drained": len(drain_times),
+        "drain_time_h": {
+            "min": min(drain_times) / 3600 if drain_times else None,
+            "max": max(drain_times) / 3600 if drain_times else None,
+            "mean": sum(drain_times) / len(drain_times) / 3600 if drain_times else None,
+        },
+        "per_channel_drain_h": {
+            name: (t / 3600 if t is not None else None)
+            for name, t in drained_at.items()
+        },
+        "peak_sends": {
+            "per_second": peak_rate(send_times, 1),
+            "per_minute": peak_rate(send_times, 60),
+            "per_hour": peak_rate(send_times, 3600),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--images", type=int, default=3)
+    parser.add_argument("--image-kb", type=int, default=800)
+    parser.add_argument(
+        "--intervals", type=int, nargs="+", default=[240], help="Интервалы в минутах"
+    )
+    parser.add_argument("--window", help='Окно постинга, например "* 9-21 * * *"')
+    parser.add_argument("--horizon-hours", type=float, default=24 * 7)
+    parser.add_argument("--start", type=float, help="Начало симуляции (unix time)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeline", help="Файл для полного таймлайна отправок")
+    parser.add_argument("--output", help="Файл для JSON с результатами")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="autopost-sim-") as tmp:
+        configure_environment(tmp)
+        result = asyncio.run(simulate(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    summary = {k: v for k, v in result.items() if k != "per_channel_drain_h"}
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import asyncio
+import contextlib
+import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from channels_files import ChannelNotFound, ChannelsFileManager
+from models import ChannelORM
+from settings import Settings, get_settings
+
+cfg: Settings = get_settings()
+
+
+class StartupTimer:
+    """Замеры шагов старта приложения для лога и /admin/startup"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+
+    @contextlib.contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = time.perf_counter() - started
+
+    def ready(self):
+        self.ready_after = time.perf_counter() - self.started
+        breakdown = ", ".join(
+            f"{name}={duration * 1000:.1f}ms" for name, duration in self.steps.items()
+        )
+        logger.success(f"Startup finished in {self.ready_after:.3f}s: {breakdown}")
+
+    def report(self) -> dict:
+        return {
+            "ready_after_ms": (
+                self.ready_after * 1000 if self.ready_after is not None else None
+            ),
+            "steps_ms": {name: value * 1000 for name, value in self.steps.items()},
+        }
+
+
+_imports_warm = False
+
+
+async def warm_imports():
+    """Тяжёлые модули, отложенные до первого использования, грузим в потоке.
+
+    Импорт aiogram занимает ~2 с: сделанный в цикле событий, он
+    останавливает и API, и тики. После первой загрузки вызов бесплатен.
+    """
+    global _imports_warm
+    if _imports_warm:
+        return
+    for module in ("aiogram.types", "aiogram.exceptions", "bot"):
+        await asyncio.to_thread(importlib.import_module, module)
+    _imports_warm = True
+
+
+startup_timer = StartupTimer()
+
+
+def verify_channels(channels: List[ChannelORM]) -> dict:
+    """Параллельная проверка структуры каталогов каналов и пакетный ремонт.
+
+    Раньше сломанный канал обнаруживался только на первом тике постинга,
+    теперь все недостающие source/done/except создаются до запуска задач.
+    """
+    if not channels:
+        return {"checked": 0, "repaired": [], "missing": []}
+
+    filemanager = ChannelsFileManager(base_dir=cfg.base_dir)
+
+    def check(name: str):
+        try:
+            return name, filemanager.check_layout(name)
+        except ChannelNotFound:
+            return name, None
+
+    names = [channel.name for channel in channels]
+    workers = max(1, min(cfg.startup_workers, len(names)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verify") as pool:
+        results = list(pool.map(check, names))
+
+        # Каталога канала нет совсем - это обработает handle_channel_not_found
+        missing = [name for name, subdirs in results if subdirs is None]
+        broken = [name for name, subdirs in results if subdirs]
+        list(pool.map(filemanager.fix_channel, broken))
+
+    for name in missing:
+        logger.warning(f"Channel directory for {name} not found on startup")
+    if broken:
+        logger.warning(f"Repaired layout of {len(broken)} channels: {broken}")
+    logger.info(f"Verified {len(names)} channel layouts with {workers} threads")
+
+    return {"checked": len(names), "repaired": broken, "missing": missing}
@@ -0,0 +1,143 @@
+import json
+import math
+import os
+import shutil
+import subprocess
+from typing import List
+
+from loguru import logger
+
+from settings import Settings, get_settings
+
+cfg: Settings = get_settings()
+
+
+class VideoTooLarge(Exception):
+    pass
+
+
+def probe(file_path: str) -> dict:
+    """Длительность (с) и битрейт аудио (бит/с) через ffprobe"""
+    output = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration:stream=codec_type,bit_rate",
+            "-of",
+            "json",
+            file_path,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    data = json.loads(output)
+    audio_bitrate = sum(
+        int(stream.get("bit_rate") or 128_000)
+        for stream in data.get("streams", [])
+        if stream.get("codec_type") == "audio"
+    )
+    return {
+        "duration": float(data["format"]["duration"]),
+        "audio_bitrate": audio_bitrate,
+    }
+
+
+def fit_video(file_path: str, max_bytes: int, output_dir: str) -> List[str]:
+    """Приводит видео к лимиту загрузки: пережатие или нарезка на части.
+
+    Если для укладывания в лимит хватает битрейта не ниже
+    video_min_bitrate_kbps - видео пережимается в H.264 целиком, иначе
+    режется без перекодирования на куски примерно по max_bytes.
+    """
+    if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+        raise VideoTooLarge(f"{file_path} exceeds upload limit and ffmpeg is missing")
+
+    os.makedirs(output_dir, exist_ok=True)
+    # Имя целиком: у 0001_1.mp4 и 0001_1.mov разные копии
+    stem = os.path.basename(file_path)
+    size = os.path.getsize(file_path)
+    info = probe(file_path)
+
+    # 5% запаса на контейнер и неравномерность битрейта
+    target = max_bytes * 8 * 0.95 / info["duration"] - info["audio_bitrate"]
+    if target >= cfg.video_min_bitrate_kbps * 1000:
+        output_path = os.path.join(output_dir, f"{stem}.mp4")
+        logger.info(
+            f"Transcoding {file_path} ({size / 1024 / 1024:.1f} MB) "
+            f"to {target / 1000:.0f} kbit/s"
+        )
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-y",
+                "-v",
+                "error",
+                "-i",
+                file_path,
+                "-c:v",
+                "libx264",
+                "-preset",
+                "veryfast",
+                "-b:v",
+                str(int(target)),
+                "-maxrate",
+                str(int(target)),
+                "-bufsize",
+                str(int(target * 2)),
+                "-c:a",
+                "aac",
+                "-movflags",
+                "+faststart",
+                output_path,
+            ],
+            check=True,
+        )
+        if os.path.getsize(output_path) <= max_bytes:
+            return [output_path]
+        os.remove(output_path)
+        logger.warning(f"Transcoded {file_path} is still too large, splitting")
+
+    parts = math.ceil(size / (max_bytes * 0.9))
+    segment = info["duration"] / parts
+    pattern = os.path.join(output_dir, f"{stem}_part%03d.mp4")
+    # Части прошлой нарезки (другой длины) не должны попасть в этот пост
+    for name in os.listdir(output_dir):
+        if name.startswith(f"{stem}_part"):
+            os.remove(os.path.join(output_dir, name))
+    logger.info(f"Splitting {file_path} into ~{parts} parts of {segment:.0f}s")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-v",
+            "error",
+            "-i",
+            file_path,
+            "-c",
+            "copy",
+            "-map",
+            "0",
+            "-f",
+            "segment",
+            "-segment_time",
+            f"{segment:.3f}",
+            "-reset_timestamps",
+            "1",
+            pattern,
+        ],
+        check=True,
+    )
+
+    # Нарезка идёт по ключевым кадрам, поэтому частей может быть больше
+    outputs = sorted(
+        os.path.join(output_dir, name)
+        for name in os.listdir(output_dir)
+        if name.startswith(f"{stem}_part")
+    )
+    oversized = [path for path in outputs if os.path.getsize(path) > max_bytes]
+    if oversized:
+        raise VideoTooLarge(f"Parts of {file_path} still exceed upload limit")
+    return outputs
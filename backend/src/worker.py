@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import time
+
+from loguru import logger
+
+from settings import Settings, get_settings
+
+cfg: Settings = get_settings()
+
+
+def shard_name(index: int) -> str:
+    return f"shard-{index}"
+
+
+async def serve_shard(index: int, total: int):
+    """Планировщик одного шарда: постит только каналы своего участка кольца"""
+    from database import create_tables
+    from scheduler import (
+        WORKER_ID,
+        add_tasks,
+        set_channel_filter,
+        start_scheduler,
+        stop_scheduler,
+    )
+    from sharding import HashRing
+    from startup import warm_imports
+
+    ring = HashRing(shard_name(i) for i in range(total))
+    node = shard_name(index)
+    set_channel_filter(lambda channel: ring.get_node(str(channel.id)) == node)
+
+    create_tables()
+    start_scheduler()
+    await add_tasks()
+    logger.success(f"Posting worker {node} started ({WORKER_ID})")
+    warmup = asyncio.create_task(warm_imports())
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    await stop.wait()
+    warmup.cancel()
+
+    await stop_scheduler()
+    logger.success(f"Posting worker {node} stopped")
+
+
+def run_shard(index: int, total: int):
+    logger.add(
+        cfg.logs_path + "/" + f"worker-{index}.log", rotation="5 hours", retention=3
+    )
+    asyncio.run(serve_shard(index, total))
+
+
+def main(processes: int):
+    """Запуск K процессов постинга и перезапуск упавших"""
+    ctx = multiprocessing.get_context("spawn")
+    workers = {}
+
+    def start(index: int):
+        process = ctx.Process(
+            target=run_shard, args=(index, processes), name=shard_name(index)
+        )
+        process.start()
+        workers[index] = process
+        logger.info(f"Started {shard_name(index)} (pid {process.pid})")
+
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for index in range(processes):
+        start(index)
+
+    while not stopping:
+        for index, process in list(workers.items()):
+            if not process.is_alive():
+                logger.error(
+                    f"{shard_name(index)} exited with code {process.exitcode}, restarting"
+                )
+                start(index)
+        time.sleep(1)
+
+    for process in workers.values():
+        process.terminate()
+    for process in workers.values():
+        process.join()
+    logger.success("Posting workers stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Posting workers")
+    parser.add_argument("-p", "--processes", type=int, default=cfg.worker_processes)
+    args = parser.parse_args()
+    main(args.processes)
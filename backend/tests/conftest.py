@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули бэкенда лежат плоско в src и импортируются по имени
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
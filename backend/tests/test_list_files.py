@@ -0,0 +1,166 @@
+import base64
+import json
+import os
+import random
+
+import pytest
+
+from channels_files import (
+    LISTING_SORTS,
+    ChannelsFileManager,
+    InvalidCursor,
+    encode_cursor,
+    file_number,
+    number_key,
+)
+
+
+@pytest.fixture
+def filemanager(tmp_path):
+    """Канал с перемешанными номерами, нечисловыми именами и разными mtime"""
+    source = tmp_path / "channel" / "source"
+    source.mkdir(parents=True)
+    rng = random.Random(42)
+    names = set()
+    while len(names) < 120:
+        number = rng.choice([f"{rng.randint(1, 40):04d}", str(rng.randint(1, 40))])
+        if rng.random() < 0.1:
+            number = rng.choice(["abc", "x", "zz"])
+        names.add(f"{number}_{rng.randint(1, 4)}.{rng.choice(['jpg', 'png'])}")
+    for name in names:
+        path = source / name
+        path.write_bytes(b"x" * rng.randint(1, 100))
+        # Одинаковые mtime у части файлов: порядок решает имя
+        mtime_ns = rng.randint(1, 30) * 1_000_000_000
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return ChannelsFileManager(base_dir=str(tmp_path))
+
+
+def expected_files(base_dir: str, sort: str, order: str) -> list:
+    source = os.path.join(base_dir, "channel", "source")
+
+    def key(name: str):
+        if sort == "number":
+            return number_key(file_number(name)) + [name]
+        if sort == "mtime":
+            return [os.stat(os.path.join(source, name)).st_mtime_ns, name]
+        return [name]
+
+    return sorted(os.listdir(source), key=key, reverse=order == "desc")
+
+
+def expected_groups(base_dir: str, sort: str, order: str) -> list:
+    numbers = {
+        file_number(name)
+        for name in os.listdir(os.path.join(base_dir, "channel", "source"))
+    }
+    key = number_key if sort == "number" else (lambda number: [number])
+    return sorted(numbers, key=key, reverse=order == "desc")
+
+
+def all_pages(filemanager, limit: int, **kwargs) -> list:
+    items, cursor = filemanager.list_files("channel", "source", limit=limit, **kwargs)
+    pages = [items]
+    while cursor is not None:
+        items, cursor = filemanager.list_files(
+            "channel", "source", cursor=cursor, limit=limit, **kwargs
+        )
+        pages.append(items)
+    assert all(len(page) <= limit for page in pages)
+    return [item for page in pages for item in page]
+
+
+@pytest.mark.parametrize("limit", [1, 7, 50, 500])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("sort", LISTING_SORTS)
+def test_files_pages_match_full_sort(filemanager, sort, order, limit):
+    items = all_pages(filemanager, limit, sort=sort, order=order)
+    assert [item["name"] for item in items] == expected_files(
+        filemanager.base_dir, sort, order
+    )
+
+
+@pytest.mark.parametrize("limit", [1, 3, 50])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("sort", ["name", "number"])
+def test_group_pages_match_full_sort(filemanager, sort, order, limit):
+    items = all_pages(filemanager, limit, sort=sort, order=order, groups=True)
+    assert [item["number"] for item in items] == expected_groups(
+        filemanager.base_dir, sort, order
+    )
+    source = os.path.join(filemanager.base_dir, "channel", "source")
+    assert sum(item["files"] for item in items) == len(os.listdir(source))
+
+
+def test_cursor_survives_deleted_files(filemanager):
+    items, cursor = filemanager.list_files("channel", "source", limit=10)
+    source = os.path.join(filemanager.base_dir, "channel", "source")
+    # Удаляем последний файл страницы: следующая страница не должна сдвинуться
+    os.remove(os.path.join(source, items[-1]["name"]))
+    names = expected_files(filemanager.base_dir, "name", "asc")
+    following, _ = filemanager.list_files("channel", "source", cursor=cursor, limit=10)
+    assert [item["name"] for item in following] == names[9:19]
+
+
+@pytest.mark.parametrize(
+    "sort, groups, key",
+    [
+        ("mtime", False, ["x"]),
+        ("mtime", False, ["x", 1]),
+        ("number", False, [0, 1, "0001"]),
+        ("number", True, ["0001"]),
+        ("name", False, [1]),
+        ("name", True, [True]),
+    ],
+)
+def test_cursor_with_wrong_key_shape(filemanager, sort, groups, key):
+    cursor = encode_cursor(["source", sort, "asc", groups], key)
+    with pytest.raises(InvalidCursor):
+        filemanager.list_files(
+            "channel", "source", sort=sort, cursor=cursor, groups=groups
+        )
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"[1, 2]").decode(),
+        encode_cursor(["source", "name", "desc", False], ["a"]),
+        base64.urlsafe_b64encode(
+            json.dumps({"q": ["source", "name", "asc", False], "k": "a"}).encode()
+        ).decode(),
+    ],
+)
+def test_foreign_or_malformed_cursor(filemanager, cursor):
+    with pytest.raises(InvalidCursor):
+        filemanager.list_files("channel", "source", cursor=cursor)
+
+
+@pytest.mark.parametrize(
+    "sort, groups", [("name", False), ("mtime", False), ("number", True)]
+)
+def test_files_removed_during_listing_are_skipped(
+    filemanager, monkeypatch, sort, groups
+):
+    source = os.path.join(filemanager.base_dir, "channel", "source")
+    removed = set()
+    iter_files = ChannelsFileManager.iter_files
+
+    def vanishing(self, name, subdir):
+        # Каждый третий файл удаляется между readdir и stat
+        for i, entry in enumerate(iter_files(self, name, subdir)):
+            if i % 3 == 0:
+                os.remove(os.path.join(source, entry.name))
+                removed.add(entry.name)
+            yield entry
+
+    monkeypatch.setattr(ChannelsFileManager, "iter_files", vanishing)
+    items, _ = filemanager.list_files(
+        "channel", "source", sort=sort, limit=1000, groups=groups
+    )
+    if groups:
+        assert sum(item["files"] for item in items) == len(os.listdir(source))
+    else:
+        assert {item["name"] for item in items} == set(os.listdir(source))
+    assert removed
@@ -1,5 +1,5 @@
 import axios from "axios";
-import { Channel, NewChannel } from "@/types/channel";
+import { Channel, FilePage, NewChannel } from "@/types/channel";
 
 
 const API_URL = 'http://89.104.68.234:8000/'// Подставляем значение из окружения, если оно есть
@@ -48,6 +48,26 @@ export const channelsApi = {
 		return response.data
 	},
 
+	checkMany: async (chat_ids: number[], force = false) => {
+		const response = await axiosInstance.post('/channels/check', { chat_ids }, { params: { force } })
+		return response.data as Record<string, boolean | null>
+	},
+
+	listFiles: async (
+		id: number,
+		subdir: "source" | "except" | "done",
+		params: {
+			sort?: "name" | "number" | "mtime"
+			order?: "asc" | "desc"
+			groups?: boolean
+			cursor?: string | null
+			limit?: number
+		} = {}
+	) => {
+		const response = await axiosInstance.get(`/channels/files/${id}/${subdir}`, { params })
+		return response.data as FilePage
+	},
+
 	update: async (id: number, channel: NewChannel) => {
 		const response = await axiosInstance.put(`/channels/update/${id}`, channel)
 		return response.data
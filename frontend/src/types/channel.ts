@@ -8,6 +8,9 @@ export interface Channel {
   path_to_done_dir: string;
   path_to_except_dir: string;
   active: boolean;
+  posting_window?: string | null;
+  duplicate_policy?: "allow" | "skip" | "reuse" | null;
+  bot_id?: string | null;
 }
 
 export interface NewChannel {
@@ -15,8 +18,29 @@ export interface NewChannel {
   chat_id: number;
   parse_mode: string;
   interval: number;
+  posting_window?: string | null;
+  duplicate_policy?: "allow" | "skip" | "reuse" | null;
+  bot_id?: string | null;
 }
 
 export interface Channels {
   channels: Channel[];
-}
\ No newline at end of file
+}
+export interface FileEntry {
+  name: string;
+  number: string;
+  size: number;
+  mtime: number;
+}
+
+export interface FileGroup {
+  number: string;
+  files: number;
+  size: number;
+  mtime: number;
+}
+
+export interface FilePage {
+  items: (FileEntry | FileGroup)[];
+  next_cursor: string | null;
+}